@@ -1,26 +1,211 @@
 import os
 import sys
-import sqlite3
+import asyncio
+import threading
+import time
+from contextlib import nullcontext
 from typing import List
 
-import gradio as gr
-from dotenv import load_dotenv
-from pydantic import BaseModel, Field
-from google import genai
-from google.genai import types
+from startup import StartupProfile, lazy
+
+# Import and initialisation timings, reported once the app is ready and by /readyz.
+profile = StartupProfile()
+
+with profile.phase("import gradio"):
+    import gradio as gr
+with profile.phase("import google-genai"):
+    from google import genai
+    from google.genai import errors, types
+with profile.phase("import other dependencies"):
+    from dotenv import load_dotenv
+    from pydantic import BaseModel, Field
+    # Both ship with gradio.
+    import uvicorn
+    from fastapi import FastAPI
+    from fastapi.responses import JSONResponse, PlainTextResponse
+
+with profile.phase("import app modules"):
+    from cardstore import CardStore
+    from concurrency import GenerationLimiter, Hedger, Saturated, SingleFlight
+    from context_cache import SystemPromptCache, prompt_hash
+    from deck import compile_deck, format_deck
+    from metrics import REGISTRY, configure_trace, span, timed
+    from policy import Plan, Policy, Tier
+    from resolver import CardResolver
+    from response_cache import ResponseCache, cache_key
+    from retrieval import build_system_prompt
+    from rules import DeckRules
+    from short import DEFAULT_FORMAT, FORMAT_PROMPTS
+    from stream_parse import RecipeStreamParser
 
 load_dotenv()
 
-api_key = os.getenv("API_KEY")
-
 TEMPERATURE = 1
 GEN_MODEL = "gemini-2.5-pro"
-client = genai.Client(api_key=api_key)
+DB_PATH = "pokemon_cards.db"
+# Send model calls somewhere other than Google, e.g. fake_gemini.py for load tests.
+GEN_BASE_URL = os.getenv("GEMINI_BASE_URL")
+
+# Build the client, prompts, caches and card indexes in a background thread
+# as soon as the server starts, and report ready on /readyz once done. When
+# off, each is built by the first request that needs it.
+WARM_UP = os.getenv("WARM_UP", "1") != "0"
+SERVER_PORT = 7860
+
+
+@lazy("genai client", profile)
+def get_client():
+    if GEN_BASE_URL:
+        return genai.Client(api_key=os.getenv("API_KEY"), http_options=types.HttpOptions(base_url=GEN_BASE_URL))
+    return genai.Client(api_key=os.getenv("API_KEY"))
+
+
+def available_formats() -> list[str]:
+    # Formats whose prompt short.py hasn't generated are left out of the selector.
+    return [fmt for fmt, path in FORMAT_PROMPTS.items() if os.path.exists(path)]
+
+
+@lazy("prompts", profile)
+def get_prompts() -> dict[str, str]:
+    # One precomputed prompt per format written by short.py.
+    prompts = {}
+    for fmt in available_formats():
+        with open(FORMAT_PROMPTS[fmt], encoding="utf-8") as f:
+            prompts[fmt] = f.read()
+    return prompts
 
-with open("system.txt", encoding="utf-8") as f:
-    system_instr = f.read()
 
 SHOW_COMMENT = True
+# Send only the cards relevant to each request instead of all of system.txt.
+# Vague requests still fall back to the full list. Only used for the default
+# format, which the retrieval index is built from.
+USE_RETRIEVAL = False
+PROMPT_TOKEN_BUDGET = 30000
+# Upload each format's prompt once as cached content and reference it by handle.
+USE_CONTEXT_CACHE = True
+CONTEXT_CACHE_TTL_S = 3600
+
+
+# Start each request on the cheapest tier expected to reach a deck that
+# passes the deck rules soonest, judged per request complexity from how long
+# each tier takes and how often its decks pass, and move up a tier when a
+# deck fails. A deck only passes if it meets the rules without repair. The last tier is the one every request used to get; with
+# USE_POLICY off, every request goes straight to it. latency_s and
+# pass_rates (per complexity bucket, simplest first) are starting guesses
+# until real requests have been measured.
+USE_POLICY = True
+POLICY_TIERS = [
+    Tier("quick", "gemini-2.5-flash", thinking_budget=2048, latency_s=25, pass_rates=(0.8, 0.5, 0.2)),
+    Tier("standard", GEN_MODEL, thinking_budget=2048, latency_s=60, pass_rates=(0.9, 0.75, 0.55)),
+    Tier("full", GEN_MODEL, thinking_budget=8192, latency_s=120, pass_rates=(0.95, 0.9, 0.85)),
+]
+POLICY_STATE_PATH = os.getenv("POLICY_STATE_PATH", "policy_state.json")
+
+policy = Policy(POLICY_TIERS, state_path=POLICY_STATE_PATH)
+
+
+@lazy("context cache", profile)
+def get_prompt_caches() -> dict[str, SystemPromptCache]:
+    # Cached content belongs to one model, so each tier's model has its own.
+    models = dict.fromkeys([GEN_MODEL, *(tier.model for tier in POLICY_TIERS)])
+    return {model: SystemPromptCache(get_client(), model, ttl_s=CONTEXT_CACHE_TTL_S) for model in models}
+
+
+def get_prompt_cache(model: str = GEN_MODEL) -> SystemPromptCache:
+    return get_prompt_caches()[model]
+
+
+# Reuse recipes for repeated requests unless the user asks for a fresh one.
+USE_RESPONSE_CACHE = True
+# Overridable so test runs against a fake API keep out of the real cache.
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "response_cache.db")
+
+
+@lazy("response cache", profile)
+def get_response_cache() -> ResponseCache:
+    return ResponseCache(RESPONSE_CACHE_PATH)
+
+
+# Show cards and the comment as they stream in instead of after the full response.
+STREAM_OUTPUT = True
+
+# Model calls allowed at once (size to the API quota), and how many more
+# requests may wait for a slot before new ones are turned away.
+MAX_CONCURRENT_GENERATIONS = 8
+MAX_WAITING_GENERATIONS = 32
+# Gradio workers and queue length in front of them.
+QUEUE_CONCURRENCY = MAX_CONCURRENT_GENERATIONS + MAX_WAITING_GENERATIONS
+QUEUE_MAX_SIZE = 64
+
+limiter = GenerationLimiter(MAX_CONCURRENT_GENERATIONS, MAX_WAITING_GENERATIONS)
+# Identical requests that arrive while one is generating share its result.
+flight = SingleFlight()
+
+# Hedge slow or unusable generations with extra calls; the first deck that
+# resolves completely and passes the deck rules after repair wins. "delayed"
+# starts a second call once the first runs past the HEDGE_PERCENTILE latency,
+# "parallel" starts HEDGE_PARALLEL calls at once. HEDGE_BUDGET caps extra
+# calls as a share of requests, and hedges are only started while a
+# generation slot is free.
+HEDGE_MODE = "off"
+HEDGE_PARALLEL = 2
+HEDGE_MAX_EXTRA = 1
+HEDGE_BUDGET = 0.2
+HEDGE_PERCENTILE = 0.9
+HEDGE_DEFAULT_DELAY_S = 150
+
+hedger = Hedger(
+    max_extra=HEDGE_MAX_EXTRA,
+    budget_ratio=HEDGE_BUDGET,
+    percentile=HEDGE_PERCENTILE,
+    default_delay_s=HEDGE_DEFAULT_DELAY_S,
+)
+
+# Stage timings, token usage and request outcomes are served on /metrics.
+# Set METRICS_TRACE to a file path to also log every span as a JSON line.
+METRICS_TRACE_PATH = os.getenv("METRICS_TRACE")
+configure_trace(METRICS_TRACE_PATH)
+
+TOKEN_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+model_tokens = REGISTRY.counter("tcg_model_tokens_total", "Tokens reported by the model, by kind.")
+request_tokens = REGISTRY.histogram(
+    "tcg_model_request_tokens", "Tokens per model call, by kind.", TOKEN_BUCKETS
+)
+requests_total = REGISTRY.counter("tcg_requests_total", "Deck requests by how they were answered.")
+deck_fixes = REGISTRY.counter("tcg_deck_fixes_total", "Fixes applied to decks to meet the deck rules.")
+REGISTRY.gauge("tcg_generations_active", "Model calls in flight.", lambda: limiter.active)
+REGISTRY.gauge("tcg_generations_waiting", "Requests waiting for a generation slot.", lambda: limiter.waiting)
+REGISTRY.gauge("tcg_generations_rejected", "Requests turned away at capacity since start.", lambda: limiter.rejected)
+policy_attempts = REGISTRY.counter(
+    "tcg_policy_attempts_total", "Generations by tier and whether the deck passed the deck rules."
+)
+REGISTRY.gauge("tcg_hedged_calls", "Extra model calls started by hedging since start.", lambda: hedger.extra)
+
+
+@lazy("resolver", profile)
+def get_resolver() -> CardResolver:
+    # Card names are indexed once per process; every request resolves in memory.
+    return CardResolver.from_db(DB_PATH)
+
+
+# ext.py's mmapped card store, shared between worker processes through the
+# page cache. Without it the app reads the same data from SQLite.
+STORE_PATH = "pokemon_cards.bin"
+
+
+@lazy("card store", profile)
+def get_card_store() -> CardStore | None:
+    return CardStore.open(STORE_PATH) if os.path.exists(STORE_PATH) else None
+
+
+@lazy("deck rules", profile)
+def get_rules() -> DeckRules:
+    # Copy limits, ACE SPEC/Radiant limits and basic Energy are fixed locally
+    # rather than by asking the model again.
+    if (store := get_card_store()) is not None:
+        return DeckRules.from_store(store)
+    return DeckRules.from_db(DB_PATH)
+
 
 class Card(BaseModel):
     count: int = Field(..., ge=1, le=20)
@@ -36,153 +221,371 @@ else:
     class Recipe(BaseModel):
         Deck: List[Card]
 
-def lookup_card(name: str, cur: sqlite3.Cursor, *, set_name: str | None = None):
-    if set_name is not None:
-        cur.execute(
-            """
-            SELECT set_name, number
-            FROM cards
-            WHERE name = ? AND set_name = ?
-            ORDER BY
-                regulation IS NULL,
-                regulation DESC
-            """,
-            (name.lower(), set_name.lower()),
+
+def generation_config(prompt_config: dict, tier: Tier) -> types.GenerateContentConfig:
+    return types.GenerateContentConfig(
+        temperature=TEMPERATURE,
+        **prompt_config,
+        response_mime_type="application/json",
+        response_schema=Recipe,
+        thinking_config=types.ThinkingConfig(
+            thinking_budget=tier.thinking_budget,
         )
-        if rows := cur.fetchall():
-            return rows[0]
-
-    cur.execute(
-        """
-        SELECT set_name, number
-        FROM cards
-        WHERE name = ?
-          AND (rarity IS NULL
-               OR rarity IN ('common','uncommon','ace spec rare',
-                             'rare','rare holo','double rare'))
-        ORDER BY
-            regulation IS NULL,
-            regulation DESC
-        """,
-        (name.lower(),),
     )
-    rows = cur.fetchall()
-    return rows[0] if rows else (None, None)
-
-
-def compile_deck(deck_dict: dict, db_path: str = "pokemon_cards.db") -> dict:
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-    groups: dict[str, list[tuple]] = {"Pokemon": [], "Trainer": [], "Energy": []}
-
-    for raw_name, (count, category) in deck_dict.items():
-        if category == "Pokemon":
-            *card_name_parts, set_tag = raw_name.split()
-            card_name = " ".join(card_name_parts)
-            if set_tag.isdigit():
-                groups[category].append((count, raw_name, "", ""))
-                continue
-            set_name, number = lookup_card(card_name, cur, set_name=set_tag)
-
-        elif category in ("Trainer", "Energy"):
-            for chop in range(3):
-                candidate = (
-                    raw_name if chop == 0 else " ".join(raw_name.split()[:-chop])
-                )
-                set_name, number = lookup_card(candidate, cur)
-                if set_name:
-                    break
-            if set_name is None:
-                sys.stderr.write(f"[WARN] No DB entry for {raw_name!r}\n")
-                continue
 
-        else:
-            continue
 
-        groups[category].append((count, raw_name, set_name, str(number).replace('swsh', '').replace('sm', '')))
-
-    conn.close()
-    return groups
-
-
-def balance_trainers_to_sixty(groups: dict) -> None:
-    total = sum(sum(x[0] for x in groups[c]) for c in groups)
-    trainers = groups.get("Trainer", [])
-
-    while total > 60 and trainers:
-        max_cnt = max(t[0] for t in trainers)
-        for idx in range(len(trainers) - 1, -1, -1):
-            cnt, *rest = trainers[idx]
-            if cnt == max_cnt:
-                trainers[idx] = (cnt - 1, *rest)
-                if trainers[idx][0] == 0:
-                    trainers.pop(idx)
-                total -= 1
-                break
-
-    while total < 60 and trainers:
-        eligible = [(i, t) for i, t in enumerate(trainers) if t[0] < 4]
-        if not eligible:
-            break
-        min_cnt = min(t[1][0] for t in eligible)
-        for idx, (cnt, *rest) in eligible:
-            if cnt == min_cnt:
-                trainers[idx] = (cnt + 1, *rest)
-                total += 1
-                break
-
-
-def format_deck(groups: dict, comment: str) -> tuple[str, str]:
-    lines: list[str] = []
-    total = 0
-    for cat in ("Pokemon", "Trainer", "Energy"):
-        entries = groups.get(cat, [])
-        if not entries:
-            continue
-        subtotal = sum(e[0] for e in entries)
-        total += subtotal
-        lines.append(f"{cat} - {subtotal}")
-        for cnt, name, set_name, num in entries:
-            if set_name:
-                pretty_name = name[:-4] if name[-3:].isupper() else name
-                lines.append(
-                    f"{cnt} {pretty_name} {set_name.upper()} {num}".replace("  ", " ")
-                )
-            else:
-                lines.append(f"{cnt} {name}")
-        lines.append("")
-    lines.append(f"Total - {total}")
-    return "\n".join(lines), comment
+def record_usage(usage) -> None:
+    # usage_metadata, when the API sends it; any count may be None.
+    if usage is None:
+        return
+    for kind, attr in (
+        ("prompt", "prompt_token_count"),
+        ("cached", "cached_content_token_count"),
+        ("thinking", "thoughts_token_count"),
+        ("output", "candidates_token_count"),
+    ):
+        if count := getattr(usage, attr, None):
+            model_tokens.inc(count, kind=kind)
+            request_tokens.observe(count, kind=kind)
+
+
+async def generate(characteristics: str, prompt_config: dict, tier: Tier):
+    return await get_client().aio.models.generate_content(
+        model=tier.model,
+        contents=characteristics,
+        config=generation_config(prompt_config, tier),
+    )
+
 
+def prompt_config_for(instr: str, model: str) -> dict:
+    # Retrieval prompts differ per request, so only the full prompts are cached.
+    if USE_CONTEXT_CACHE and instr in get_prompts().values():
+        return get_prompt_cache(model).config(instr)
+    return {"system_instruction": instr}
 
-def build_deck(characteristics: str) -> tuple[str, str]:
-    response = client.models.generate_content(
-        model=GEN_MODEL,
+
+def cached_content_rejected(exc: errors.APIError, prompt_config: dict) -> bool:
+    # A handle that expired, was deleted or doesn't fit the request. Rate
+    # limits and server errors are left to tier escalation.
+    return (
+        "cached_content" in prompt_config
+        and exc.code in (400, 403, 404)
+        and "cache" in str(exc).lower()
+    )
+
+
+async def generate_recipe(characteristics: str, instr: str, tier: Tier) -> Recipe:
+    # Creating or refreshing the cache handle is a blocking call.
+    prompt_config = await asyncio.to_thread(prompt_config_for, instr, tier.model)
+    with span("model", tier=tier.name):
+        try:
+            response = await generate(characteristics, prompt_config, tier)
+        except errors.APIError as exc:
+            if not cached_content_rejected(exc, prompt_config):
+                raise
+            # The handle expired or was deleted server-side; send the prompt inline.
+            await asyncio.to_thread(get_prompt_cache(tier.model).invalidate, instr)
+            response = await generate(characteristics, {"system_instruction": instr}, tier)
+    record_usage(response.usage_metadata)
+    return response.parsed
+
+
+async def generate_stream(characteristics: str, prompt_config: dict, tier: Tier):
+    return await get_client().aio.models.generate_content_stream(
+        model=tier.model,
         contents=characteristics,
-        config=types.GenerateContentConfig(
-            temperature=TEMPERATURE,
-            system_instruction=system_instr,
-            response_mime_type="application/json",
-            response_schema=Recipe,
-            thinking_config=types.ThinkingConfig(
-                thinking_budget=8192,
-            )
-        ),
+        config=generation_config(prompt_config, tier),
     )
 
-    recipe = response.parsed
+
+async def stream_recipe_text(characteristics: str, instr: str, tier: Tier):
+    prompt_config = await asyncio.to_thread(prompt_config_for, instr, tier.model)
+    # Includes the time the caller spends on each chunk, which is small.
+    with span("model", tier=tier.name):
+        try:
+            stream = await generate_stream(characteristics, prompt_config, tier)
+            first = await anext(stream, None)
+        except errors.APIError as exc:
+            if not cached_content_rejected(exc, prompt_config):
+                raise
+            await asyncio.to_thread(get_prompt_cache(tier.model).invalidate, instr)
+            stream = await generate_stream(characteristics, {"system_instruction": instr}, tier)
+            first = await anext(stream, None)
+        if first is None:
+            return
+        # Each chunk carries the running totals; the last one has the final counts.
+        usage = first.usage_metadata
+        yield first.text or ""
+        async for chunk in stream:
+            usage = chunk.usage_metadata or usage
+            yield chunk.text or ""
+    record_usage(usage)
+
+
+def prepare_request(characteristics: str, force_fresh: bool, fmt: str) -> tuple[str, str, str | None]:
+    prompts = get_prompts()
+    if fmt not in prompts:
+        if fmt not in FORMAT_PROMPTS:
+            raise gr.Error(f"Unknown format {fmt!r}.")
+        raise gr.Error(f"The {fmt} format isn't available: run short.py to build {FORMAT_PROMPTS[fmt]}.")
+    instr = prompts[fmt]
+    if USE_RETRIEVAL and fmt == DEFAULT_FORMAT:
+        instr = build_system_prompt(characteristics, token_budget=PROMPT_TOKEN_BUDGET) or instr
+
+    # Keyed on GEN_MODEL rather than the tier that answers: the tier is picked
+    # per request, it isn't part of what was asked for.
+    key = cache_key(characteristics, GEN_MODEL, TEMPERATURE, prompt_hash(instr))
+    cached = None
+    if USE_RESPONSE_CACHE and not force_fresh:
+        cached = get_response_cache().get(key)
+    return instr, key, cached
+
+
+def assemble_deck(recipe: Recipe) -> tuple[str, str]:
     deck_dict = {card.name: (card.count, card.category) for card in recipe.Deck}
 
-    groups = compile_deck(deck_dict)
-    balance_trainers_to_sixty(groups)
+    groups = compile_deck(deck_dict, resolver=get_resolver(), store=get_card_store())
+    rules = get_rules()
+    with span("repair"):
+        fixes = rules.repair(groups)
+    deck_fixes.inc(len(fixes))
+    for problem in rules.validate(groups):
+        sys.stderr.write(f"[WARN] Deck still has {problem}\n")
 
     if SHOW_COMMENT:
-        return format_deck(groups, recipe.Comment)
+        comment = recipe.Comment
+        if fixes:
+            comment += "\n\nAdjusted to the deck rules: " + "; ".join(fixes) + "."
+        return format_deck(groups, comment)
     else:
         return format_deck(groups, '')
 
 
-with gr.Blocks(title="Pokémon Deck Builder") as demo:
+def note_coalesced() -> None:
+    requests_total.inc(outcome="coalesced")
+    sys.stderr.write(f"[INFO] Joined an identical in-flight request ({flight.coalesced} coalesced so far)\n")
+
+
+def busy_message() -> str:
+    return (f"All {limiter.limit} generation slots are busy; {limiter.waiting} "
+            f"request(s) ahead of you, about {limiter.eta_s():.0f}s to wait.")
+
+
+def check_recipe(recipe: Recipe | None) -> tuple[bool, bool]:
+    """
+    Whether the recipe resolves completely and meets the deck rules after
+    repair, and whether it already met them as generated.
+    """
+    if recipe is None:
+        return False, False
+    deck_dict = {card.name: (card.count, card.category) for card in recipe.Deck}
+    groups = compile_deck(deck_dict, resolver=get_resolver(), store=get_card_store())
+    if sum(len(rows) for rows in groups.values()) < len(deck_dict):
+        return False, False
+    if any(set_name is None for _, _, set_name, _ in groups["Pokemon"]):
+        return False, False
+    rules = get_rules()
+    as_generated = not rules.validate(groups)
+    rules.repair(groups)
+    return not rules.validate(groups), as_generated
+
+
+def recipe_is_valid(recipe: Recipe | None) -> bool:
+    return check_recipe(recipe)[0]
+
+
+def plan_for(characteristics: str) -> Plan:
+    if USE_POLICY:
+        return policy.plan(characteristics)
+    return Plan(0, POLICY_TIERS[-1:])
+
+
+def record_attempt(plan: Plan, tier: Tier, passed: bool) -> None:
+    policy_attempts.inc(tier=tier.name, outcome="passed" if passed else "failed")
+    if USE_POLICY:
+        policy.record_outcome(plan.bucket, tier, passed)
+
+
+def record_latency(plan: Plan, tier: Tier, seconds: float) -> None:
+    if USE_POLICY:
+        policy.record_latency(plan.bucket, tier, seconds)
+
+
+async def generate_in_slot(characteristics: str, instr: str, plan: Plan, tier: Tier) -> Recipe:
+    async with limiter.slot():
+        # Timed inside the slot, so queueing under load doesn't count against the tier.
+        started = time.perf_counter()
+        recipe = await generate_recipe(characteristics, instr, tier)
+        record_latency(plan, tier, time.perf_counter() - started)
+        return recipe
+
+
+async def generate_hedged(characteristics: str, instr: str, plan: Plan, tier: Tier) -> Recipe:
+    if HEDGE_MODE == "off":
+        return await generate_in_slot(characteristics, instr, plan, tier)
+    recipe = await hedger.run(
+        lambda: generate_in_slot(characteristics, instr, plan, tier),
+        recipe_is_valid,
+        upfront=HEDGE_PARALLEL if HEDGE_MODE == "parallel" else 1,
+        can_hedge=lambda: not limiter.busy(),
+    )
+    sys.stderr.write(f"[INFO] Hedging: {hedger.extra} extra call(s) for {hedger.primary} "
+                     f"request(s), {hedger.wins} won by a hedged race\n")
+    return recipe
+
+
+async def generate_planned(
+    characteristics: str, instr: str, plan: Plan, fallback: Recipe | None = None
+) -> Recipe:
+    """
+    Generates on each tier of the plan in turn until a deck meets the deck
+    rules as generated. Repair would hide a weaker tier's mistakes, so a
+    deck that needs it counts as a failure. If no tier passes, the first
+    deck that repair can fix is used (fallback, if given, is one from an
+    earlier attempt), otherwise the last tier's.
+    """
+    for i, tier in enumerate(plan.tiers):
+        last = i == len(plan.tiers) - 1
+        try:
+            recipe = await generate_hedged(characteristics, instr, plan, tier)
+        except errors.APIError as exc:
+            # e.g. the cheaper model's quota is used up; the next tier may still answer.
+            record_attempt(plan, tier, False)
+            if last:
+                if fallback is not None:
+                    return fallback
+                raise
+            sys.stderr.write(f"[WARN] {tier.name} tier failed ({exc}), moving up to {plan.tiers[i + 1].name}\n")
+            continue
+        valid, passed = check_recipe(recipe)
+        record_attempt(plan, tier, passed)
+        if passed:
+            return recipe
+        if last:
+            return recipe if valid or fallback is None else fallback
+        if valid and fallback is None:
+            fallback = recipe
+        sys.stderr.write(f"[INFO] {tier.name} tier deck needed fixing to meet the deck rules, "
+                         f"moving up to {plan.tiers[i + 1].name}\n")
+
+
+async def generate_and_store(characteristics: str, instr: str, key: str) -> Recipe:
+    recipe = await generate_planned(characteristics, instr, plan_for(characteristics))
+    if recipe is None:
+        raise ValueError("The model's response didn't parse as a recipe.")
+    requests_total.inc(outcome="generated")
+    if USE_RESPONSE_CACHE:
+        await asyncio.to_thread(get_response_cache().put, key, recipe.model_dump_json())
+    return recipe
+
+
+@timed("build_deck")
+async def build_deck(
+    characteristics: str, force_fresh: bool = False, fmt: str = DEFAULT_FORMAT
+) -> tuple[str, str]:
+    instr, key, cached = await asyncio.to_thread(prepare_request, characteristics, force_fresh, fmt)
+    if cached is not None:
+        requests_total.inc(outcome="cached")
+        return assemble_deck(Recipe.model_validate_json(cached))
+
+    try:
+        if force_fresh:
+            # Someone asking for variety shouldn't get another user's deck.
+            recipe = await generate_and_store(characteristics, instr, key)
+        else:
+            recipe = await flight.do(
+                key, lambda: generate_and_store(characteristics, instr, key), on_join=note_coalesced
+            )
+    except Saturated as exc:
+        requests_total.inc(outcome="rejected")
+        raise gr.Error(f"The deck builder is at capacity, {exc}.") from exc
+    return assemble_deck(recipe)
+
+
+@timed("build_deck_stream")
+async def build_deck_stream(characteristics: str, force_fresh: bool = False, fmt: str = DEFAULT_FORMAT):
+    instr, key, cached = await asyncio.to_thread(prepare_request, characteristics, force_fresh, fmt)
+    if cached is not None:
+        requests_total.inc(outcome="cached")
+        yield assemble_deck(Recipe.model_validate_json(cached))
+        return
+
+    while not force_fresh and (fut := flight.join(key)) is not None:
+        note_coalesced()
+        yield "", "An identical request is already generating, sharing its deck…"
+        try:
+            recipe = await flight.wait(fut)
+        except Saturated as exc:
+            requests_total.inc(outcome="rejected")
+            yield "", f"The deck builder is at capacity, {exc}."
+            return
+        if recipe is not None:
+            yield assemble_deck(recipe)
+            return
+
+    with flight.lead(key) if not force_fresh else nullcontext() as fut:
+        parser = RecipeStreamParser()
+        groups: dict[str, list[tuple]] = {"Pokemon": [], "Trainer": [], "Energy": []}
+        plan = plan_for(characteristics)
+        tier = plan.tiers[0]
+        try:
+            if limiter.busy():
+                yield "", busy_message()
+            try:
+                async with limiter.slot():
+                    started = time.perf_counter()
+                    async for text in stream_recipe_text(characteristics, instr, tier):
+                        entries = parser.feed(text)
+                        for entry in entries:
+                            # Resolve each entry as soon as it is complete; the deck is only
+                            # balanced once the whole recipe is in.
+                            try:
+                                card = Card.model_validate(entry)
+                            except ValueError:
+                                continue
+                            part = compile_deck(
+                                {card.name: (card.count, card.category)}, resolver=get_resolver(), store=get_card_store()
+                            )
+                            for cat, rows in part.items():
+                                groups[cat].extend(rows)
+                        if entries or parser.partial_comment():
+                            yield format_deck(groups, parser.partial_comment() if SHOW_COMMENT else '')
+                    record_latency(plan, tier, time.perf_counter() - started)
+                recipe = Recipe.model_validate_json(parser.text)
+            except (errors.APIError, ValueError) as exc:
+                # An API error or a malformed or truncated stream (pydantic's
+                # ValidationError is a ValueError); a larger tier may still answer.
+                record_attempt(plan, tier, False)
+                if len(plan.tiers) == 1:
+                    raise
+                sys.stderr.write(f"[WARN] {tier.name} tier stream failed ({exc}), moving up to {plan.tiers[1].name}\n")
+                yield format_deck(groups, "The deck didn't come through, building it again…")
+                recipe = await generate_planned(characteristics, instr, plan._replace(tiers=plan.tiers[1:]))
+            else:
+                valid, passed = check_recipe(recipe)
+                record_attempt(plan, tier, passed)
+                if not passed and len(plan.tiers) > 1:
+                    # The streamed deck stays on screen while a larger tier has a go.
+                    yield format_deck(groups, "This deck needed fixing to meet the deck rules, building a better one…")
+                    recipe = await generate_planned(
+                        characteristics, instr, plan._replace(tiers=plan.tiers[1:]), fallback=recipe if valid else None
+                    )
+        except Saturated as exc:
+            requests_total.inc(outcome="rejected")
+            yield "", f"The deck builder is at capacity, {exc}."
+            return
+
+        if recipe is None:
+            raise ValueError("The model's response didn't parse as a recipe.")
+        requests_total.inc(outcome="generated")
+        if USE_RESPONSE_CACHE:
+            await asyncio.to_thread(get_response_cache().put, key, recipe.model_dump_json())
+        if fut is not None:
+            fut.set_result(recipe)
+    yield assemble_deck(recipe)
+
+
+with profile.phase("build UI"), gr.Blocks(title="Pokémon Deck Builder") as demo:
 
     with gr.Row():
         with gr.Column(scale=5):
@@ -199,6 +602,12 @@ with gr.Blocks(title="Pokémon Deck Builder") as demo:
                 lines=6,
                 placeholder="E.g. Fast lightning deck around Pikachu and Raichu…",
             )
+            deck_format = gr.Dropdown(
+                label="Format",
+                choices=[(name.title(), name) for name in available_formats()],
+                value=DEFAULT_FORMAT,
+            )
+            fresh = gr.Checkbox(label="Force a fresh deck (skip cached results)", value=False)
             btn = gr.Button("Generate Deck", variant="primary")
             out_comments = gr.Textbox(label="Comments", lines=8, interactive=False)
 
@@ -211,9 +620,59 @@ with gr.Blocks(title="Pokémon Deck Builder") as demo:
         out_comments.visible = False
             
 
-    btn.click(fn=build_deck, inputs=inp, outputs=[out_deck, out_comments])
+    btn.click(
+        fn=build_deck_stream if STREAM_OUTPUT else build_deck,
+        inputs=[inp, fresh, deck_format],
+        outputs=[out_deck, out_comments],
+        # A fixed name for API clients such as loadtest.py, whichever function serves it.
+        api_name="build_deck",
+    )
 
-demo.launch(
-    server_name="0.0.0.0",
-    server_port=7860,
-)
+demo.queue(default_concurrency_limit=QUEUE_CONCURRENCY, max_size=QUEUE_MAX_SIZE)
+
+
+def warm_up() -> None:
+    try:
+        get_client()
+        prompts = get_prompts()
+        get_response_cache()
+        get_resolver()
+        get_rules()
+        if USE_CONTEXT_CACHE:
+            with profile.phase("warm context cache"):
+                for cache in get_prompt_caches().values():
+                    cache.handle(prompts[DEFAULT_FORMAT])
+    except Exception as exc:
+        # Stay unready so the load balancer keeps traffic away.
+        sys.stderr.write(f"[ERROR] Warm-up failed: {exc!r}\n")
+        return
+    profile.mark_ready()
+
+
+def create_app() -> FastAPI:
+    api = FastAPI()
+
+    @api.get("/healthz")
+    def healthz():
+        # Liveness: the process is up and serving HTTP.
+        return {"status": "ok"}
+
+    @api.get("/readyz")
+    def readyz():
+        # Readiness: warm-up is done, so requests won't pay for initialisation.
+        return JSONResponse(profile.as_dict(), status_code=200 if profile.ready else 503)
+
+    @api.get("/metrics")
+    def metrics():
+        # Prometheus text exposition format.
+        return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+    return gr.mount_gradio_app(api, demo, path="/")
+
+
+if __name__ == "__main__":
+    if WARM_UP:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    else:
+        profile.mark_ready()
+    uvicorn.run(create_app(), host="0.0.0.0", port=SERVER_PORT)
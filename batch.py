@@ -0,0 +1,184 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+
+from google.genai import errors
+
+import app
+from concurrency import RateLimiter, Saturated, backoff_s
+from short import FORMATS
+
+# API errors worth another attempt: quota and server-side failures.
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def prompt_id(prompt: str, fmt: str) -> str:
+    return hashlib.sha1(f"{fmt}\n{prompt}".encode("utf-8")).hexdigest()[:12]
+
+
+def read_prompts(path: str, default_format: str) -> list[dict]:
+    """
+    Reads prompts from a text file, one per line (# starts a comment), or a
+    JSONL file of {"prompt": ..., "format": ..., "id": ...} objects where
+    format and id are optional. Repeated prompts get distinct ids, so each
+    one produces its own deck.
+    """
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            item = json.loads(line) if path.endswith(".jsonl") else {"prompt": line}
+            item.setdefault("format", default_format)
+            if item["format"] not in FORMATS:
+                raise ValueError(f"Unknown format {item['format']!r} for prompt {item['prompt']!r}")
+            items.append(item)
+
+    seen: dict[str, int] = {}
+    for item in items:
+        if "id" not in item:
+            base = prompt_id(item["prompt"], item["format"])
+            seen[base] = seen.get(base, 0) + 1
+            item["id"] = base if seen[base] == 1 else f"{base}-{seen[base]}"
+            # Otherwise the repeat would get the first one's deck from the response cache.
+            item.setdefault("fresh", seen[base] > 1)
+    return items
+
+
+def finished_ids(out_path: str, retry_failed: bool) -> set[str]:
+    # The output file is the checkpoint: every finished prompt has a line.
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short when the last run was killed.
+                continue
+            if not (retry_failed and record.get("error")):
+                done.add(record["id"])
+    return done
+
+
+def retryable(exc: Exception) -> bool:
+    if isinstance(exc, errors.APIError):
+        return exc.code in RETRY_STATUS
+    # build_deck turns work away at capacity with a gr.Error raised from Saturated.
+    if isinstance(exc, Saturated) or isinstance(exc.__cause__, Saturated):
+        return True
+    # A malformed recipe (JSON and pydantic validation errors are ValueErrors),
+    # which a new generation may not repeat. Anything else is a bug or a
+    # setup problem, such as a missing prompt file, that waiting won't fix.
+    return isinstance(exc, ValueError)
+
+
+class Batch:
+    """Generates a deck per prompt and appends each result to a JSONL file."""
+
+    def __init__(self, out_path: str, rate: RateLimiter, retries: int, fresh: bool, total: int):
+        self.out = open(out_path, "a", encoding="utf-8")
+        self.rate = rate
+        self.retries = retries
+        self.fresh = fresh
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+
+    async def generate(self, item: dict) -> dict:
+        started = time.monotonic()
+        for attempt in range(1, self.retries + 2):
+            await self.rate.acquire()
+            try:
+                deck, comment = await app.build_deck(
+                    item["prompt"], self.fresh or item.get("fresh", False), item["format"]
+                )
+            except Exception as exc:
+                if attempt > self.retries or not retryable(exc):
+                    return {"error": f"{type(exc).__name__}: {exc}", "attempts": attempt,
+                            "elapsed_s": time.monotonic() - started}
+                delay = backoff_s(attempt)
+                sys.stderr.write(f"[WARN] {item['id']} attempt {attempt} failed ({exc}), retrying in {delay:.0f}s\n")
+                await asyncio.sleep(delay)
+                continue
+            return {"deck": deck, "comment": comment, "attempts": attempt,
+                    "elapsed_s": time.monotonic() - started}
+
+    def write(self, item: dict, result: dict) -> None:
+        record = {"id": item["id"], "prompt": item["prompt"], "format": item["format"], **result}
+        self.out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.out.flush()
+        os.fsync(self.out.fileno())
+        self.done += 1
+        self.failed += "error" in result
+        rate = self.done / max(1e-9, time.monotonic() - self.started) * 60
+        sys.stderr.write(f"[INFO] {self.done}/{self.total} done, {self.failed} failed, {rate:.1f} decks/min\n")
+
+    async def worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            item = await queue.get()
+            try:
+                self.write(item, await self.generate(item))
+            finally:
+                queue.task_done()
+
+    async def run(self, items: list[dict], workers: int) -> None:
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in items:
+            queue.put_nowait(item)
+        tasks = [asyncio.create_task(self.worker(queue)) for _ in range(workers)]
+        joined = asyncio.create_task(queue.join())
+        try:
+            finished, _ = await asyncio.wait([joined, *tasks], return_when=asyncio.FIRST_COMPLETED)
+            # A worker only stops early on an error, e.g. a full disk.
+            for task in finished - {joined}:
+                task.result()
+        finally:
+            joined.cancel()
+            for task in tasks:
+                task.cancel()
+            self.out.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a deck for every prompt in a file, unattended.")
+    parser.add_argument("prompts", help="text file with one prompt per line, or JSONL with prompt/format/id")
+    parser.add_argument("--out", default="decks.jsonl", help="JSONL file to append results to")
+    parser.add_argument("--format", choices=list(FORMATS), default=app.DEFAULT_FORMAT,
+                        help="format for prompts that don't name one")
+    parser.add_argument("--workers", type=int, default=app.MAX_CONCURRENT_GENERATIONS,
+                        help="decks generated at once")
+    parser.add_argument("--rate", type=float, default=10,
+                        help="decks started per minute at most, retries included (size to the API quota)")
+    parser.add_argument("--retries", type=int, default=4, help="extra attempts per prompt after a failure")
+    parser.add_argument("--fresh", action="store_true", help="skip the response cache")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="run prompts again whose earlier result was an error (the newest line per id wins)")
+    parser.add_argument("--limit", type=int, help="stop after this many prompts")
+    args = parser.parse_args(argv)
+
+    items = read_prompts(args.prompts, args.format)
+    done = finished_ids(args.out, args.retry_failed)
+    pending = [item for item in items if item["id"] not in done]
+    print(f"{len(items)} prompts, {len(items) - len(pending)} already in {args.out}, {len(pending)} to go.")
+    pending = pending[:args.limit]
+    if not pending:
+        return
+
+    batch = Batch(args.out, RateLimiter(args.rate / 60, burst=args.workers), args.retries, args.fresh, len(pending))
+    try:
+        asyncio.run(batch.run(pending, args.workers))
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to resume.")
+    print(f"{batch.done} decks written to {args.out}, {batch.failed} failed.")
+
+
+if __name__ == "__main__":
+    main()
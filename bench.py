@@ -0,0 +1,190 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+
+import ext
+import short
+import synth
+from deck import compile_deck, format_deck
+from resolver import CardResolver
+from rules import DeckRules, balance_trainers_to_sixty
+
+# Each stage of the prompt build that the benchmark runs, as short.py flags.
+SHORT_MODES = {"classic": [], "pipeline": ["--pipeline"]}
+
+
+def summarize(seconds: list[float]) -> dict:
+    ordered = sorted(seconds)
+    return {
+        "runs": len(ordered),
+        "min_s": ordered[0],
+        "median_s": statistics.median(ordered),
+        "p95_s": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max_s": ordered[-1],
+        "total_s": sum(ordered),
+    }
+
+
+def quietly(fn, *args):
+    # ext.py and short.py report progress on stdout, and fix_name on stderr.
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        return fn(*args)
+
+
+def bench_ingest(repeat: int, workers: int) -> dict:
+    runs, stages = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        stages.append(quietly(ext.main, ["--workers", str(workers)]))
+        runs.append(time.perf_counter() - started)
+    result = summarize(runs)
+    # Per-stage times from ext.main, median over the runs.
+    result["stages_s"] = {stage: statistics.median(run[stage] for run in stages) for stage in stages[0]}
+    return result
+
+
+def bench_prompts(repeat: int) -> dict:
+    results = {}
+    for mode, flags in SHORT_MODES.items():
+        runs = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            quietly(short.main, flags)
+            runs.append(time.perf_counter() - started)
+        results[mode] = summarize(runs)
+        results[mode]["bytes"] = {fmt: os.path.getsize(path) for fmt, path in short.FORMAT_PROMPTS.items()}
+    return results
+
+
+def bench_decks(recipes: list[dict], repeat: int) -> dict:
+    resolver = CardResolver.from_db(ext.DB_PATH)
+    rules = DeckRules.from_db(ext.DB_PATH)
+    timings: dict[str, list[float]] = {"compile_deck": [], "compile_deck_sql": [], "repair": [],
+                                       "balance_trainers_to_sixty": [], "format_deck": []}
+    unresolved = 0
+    invalid = 0
+
+    def timed(stage, fn, *args):
+        started = time.perf_counter()
+        value = fn(*args)
+        timings[stage].append(time.perf_counter() - started)
+        return value
+
+    with contextlib.redirect_stderr(io.StringIO()):
+        for _ in range(repeat):
+            for recipe in recipes:
+                groups = timed("compile_deck", compile_deck, recipe, ext.DB_PATH, resolver)
+                timed("compile_deck_sql", compile_deck, recipe, ext.DB_PATH)
+                unresolved += len(recipe) - sum(len(rows) for rows in groups.values())
+                balanced = {cat: list(rows) for cat, rows in groups.items()}
+                timed("balance_trainers_to_sixty", balance_trainers_to_sixty, balanced)
+                timed("repair", rules.repair, groups)
+                invalid += bool(rules.validate(groups))
+                timed("format_deck", format_deck, groups, "")
+    results = {stage: summarize(seconds) for stage, seconds in timings.items()}
+    results["recipes"] = len(recipes)
+    results["dropped_entries"] = unresolved // repeat
+    # Decks repair() left breaking a rule; anything but 0 is a repair bug.
+    results["invalid_after_repair"] = invalid // repeat
+    return results
+
+
+def bench_scale(scale: int, args) -> dict:
+    workdir = os.path.abspath(os.path.join(args.workdir, f"scale_{scale}"))
+    os.makedirs(workdir, exist_ok=True)
+    data_root = os.path.join(workdir, os.path.dirname(os.path.dirname(ext.SETS_PATH)))
+    result = {}
+
+    started = time.perf_counter()
+    if not os.path.exists(os.path.join(workdir, ext.SETS_PATH)) or args.regenerate:
+        result["dataset"] = synth.generate(data_root, scale, args.seed)
+    result["generate_s"] = time.perf_counter() - started
+
+    cwd = os.getcwd()
+    # ext.py and short.py read and write paths relative to the working directory.
+    os.chdir(workdir)
+    try:
+        print(f"[{scale}x] ingest", file=sys.stderr)
+        result["ingest"] = bench_ingest(args.repeat, args.workers)
+        with sqlite3.connect(ext.DB_PATH) as conn:
+            result["cards"] = conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0]
+        print(f"[{scale}x] prompts", file=sys.stderr)
+        result["prompts"] = bench_prompts(args.repeat)
+        print(f"[{scale}x] decks", file=sys.stderr)
+        recipes = synth.canned_recipes(ext.DB_PATH, args.recipes, args.seed)
+        result["decks"] = bench_decks(recipes, args.repeat)
+    finally:
+        os.chdir(cwd)
+    return result
+
+
+def environment(args) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": vars(args),
+    }
+
+
+def compare(baseline: dict, current: dict) -> None:
+    """Prints the median time of each benchmark against a baseline results file."""
+    def medians(results, path=()):
+        for key, value in results.items():
+            if isinstance(value, dict) and "median_s" in value:
+                yield path + (key,), value["median_s"]
+            elif isinstance(value, dict):
+                yield from medians(value, path + (key,))
+
+    before = dict(medians(baseline["scales"]))
+    for name, seconds in medians(current["scales"]):
+        if name in before:
+            print(f"  {'/'.join(name):<48}{before[name]:10.4f}s -> {seconds:10.4f}s  "
+                  f"x{before[name] / seconds if seconds else float('inf'):.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark ext.py, short.py and deck assembly on synthetic card data."
+    )
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10],
+                        help="dataset sizes as multiples of the real one (10x writes ~190 MB, 100x ~2 GB)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each benchmark")
+    parser.add_argument("--recipes", type=int, default=200, help="canned recipes per deck run")
+    parser.add_argument("--workers", type=int, default=1, help="ext.py --workers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default="bench_data", help="where datasets and built files go")
+    parser.add_argument("--regenerate", action="store_true", help="rewrite datasets that already exist")
+    parser.add_argument("--out", default="bench_results.json", help="JSON file to write results to")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    results = {"environment": environment(args), "scales": {}}
+    for scale in args.scales:
+        results["scales"][str(scale)] = bench_scale(scale, args)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.out}.")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
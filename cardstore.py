@@ -0,0 +1,199 @@
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+
+MAGIC = b"TCGC"
+VERSION = 1
+# magic, version, rows, columns, strings, hash buckets, name groups
+HEADER = struct.Struct("<4sIIIIII")
+
+COLUMNS = (
+    "id", "name", "set_name", "types", "number", "hp", "effect", "abilities",
+    "attacks", "retreat", "evolve_from", "rarity", "card_type", "vstar_power",
+    "regulation", "series", "is_ace_spec", "is_radiant", "is_rule_box", "is_basic_energy",
+)
+# Stored as the value itself rather than a string table id.
+INT_COLUMNS = frozenset({"retreat", "is_ace_spec", "is_radiant", "is_rule_box", "is_basic_energy"})
+COLUMN_INDEX = {name: i for i, name in enumerate(COLUMNS)}
+
+
+def _name_hash(name: bytes) -> int:
+    return zlib.crc32(name)
+
+
+def write_store(conn, path: str) -> int:
+    """Writes every card in the DB to a columnar file that CardStore can mmap."""
+    # Same order as lookup_card and the alias table: newest regulation first.
+    rows = conn.execute(
+        f"""
+        SELECT {", ".join(COLUMNS)}
+        FROM cards
+        ORDER BY regulation DESC, set_name, CAST(number AS INTEGER)
+        """
+    ).fetchall()
+
+    strings: dict[str, int] = {}
+    columns = [array("I") for _ in COLUMNS]
+    for row in rows:
+        for col, name, value in zip(columns, COLUMNS, row):
+            if name in INT_COLUMNS:
+                col.append(value or 0)
+            else:
+                col.append(strings.setdefault(value or "", len(strings)))
+
+    # Postings keep row order, so each name's rows stay newest first.
+    name_col = COLUMN_INDEX["name"]
+    groups: dict[int, list[int]] = {}
+    for row_id, sid in enumerate(columns[name_col]):
+        groups.setdefault(sid, []).append(row_id)
+
+    blob = bytearray()
+    offsets = array("I", [0])
+    encoded = []
+    for text in strings:
+        data = text.encode("utf-8")
+        encoded.append(data)
+        blob += data
+        offsets.append(len(blob))
+
+    n_buckets = 1
+    while n_buckets < 2 * len(groups):
+        n_buckets *= 2
+    buckets = array("I", [0]) * n_buckets
+    group_table = array("I")
+    postings = array("I")
+    for group, (sid, row_ids) in enumerate(groups.items()):
+        group_table.extend((sid, len(postings), len(row_ids)))
+        postings.extend(row_ids)
+        slot = _name_hash(encoded[sid]) & (n_buckets - 1)
+        while buckets[slot]:
+            slot = (slot + 1) & (n_buckets - 1)
+        buckets[slot] = group + 1
+
+    if sys.byteorder != "little":
+        for arr in (offsets, *columns, buckets, group_table, postings):
+            arr.byteswap()
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(rows), len(COLUMNS), len(strings), n_buckets, len(groups)))
+        offsets.tofile(f)
+        for col in columns:
+            col.tofile(f)
+        buckets.tofile(f)
+        group_table.tofile(f)
+        postings.tofile(f)
+        f.write(blob)
+    # Processes that already mapped the old file keep reading it until they reopen.
+    os.replace(tmp_path, path)
+    return len(rows)
+
+
+class Card:
+    """A lazy view of one row; fields are decoded when they are read."""
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: "CardStore", row: int):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, key: str):
+        return self._store.value(self._row, COLUMN_INDEX[key])
+
+    def get(self, key: str, default=None):
+        return self[key] if key in COLUMN_INDEX else default
+
+    def keys(self) -> tuple[str, ...]:
+        return COLUMNS
+
+    def __repr__(self) -> str:
+        return f"Card({self['id']!r})"
+
+
+class CardStore:
+    """Read-only access to the file written by write_store, without SQLite."""
+
+    def __init__(self, buf):
+        if sys.byteorder != "little":
+            raise ValueError("the card store is little-endian; read cards through SQLite on this host")
+        magic, version, n_rows, n_cols, n_strings, n_buckets, n_groups = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC or version != VERSION or n_cols != len(COLUMNS):
+            raise ValueError("unrecognised card store, rebuild it with ext.py")
+        self._buf = buf
+        view = memoryview(buf)
+        pos = HEADER.size
+
+        def u32(count: int) -> memoryview:
+            nonlocal pos
+            part = view[pos:pos + 4 * count].cast("I")
+            pos += 4 * count
+            return part
+
+        self._offsets = u32(n_strings + 1)
+        self._columns = [u32(n_rows) for _ in COLUMNS]
+        self._buckets = u32(n_buckets)
+        self._groups = u32(3 * n_groups)
+        self._postings = u32(n_rows)
+        self._blob = view[pos:]
+        self._n_rows = n_rows
+
+    @classmethod
+    def open(cls, path: str = "pokemon_cards.bin") -> "CardStore":
+        with open(path, "rb") as f:
+            # Every process mapping the file shares the same page cache.
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def close(self) -> None:
+        for part in (self._offsets, *self._columns, self._buckets, self._groups, self._postings, self._blob):
+            part.release()
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+
+    def __len__(self) -> int:
+        return self._n_rows
+
+    def __iter__(self):
+        return (Card(self, row) for row in range(self._n_rows))
+
+    def card(self, row: int) -> Card:
+        return Card(self, row)
+
+    def _string(self, sid: int) -> str:
+        return str(self._blob[self._offsets[sid]:self._offsets[sid + 1]], "utf-8")
+
+    def value(self, row: int, col: int):
+        raw = self._columns[col][row]
+        if COLUMNS[col] in INT_COLUMNS:
+            return raw
+        return self._string(raw)
+
+    def rows_named(self, name: str) -> list[int]:
+        data = name.encode("utf-8")
+        mask = len(self._buckets) - 1
+        slot = _name_hash(data) & mask
+        while group := self._buckets[slot]:
+            sid, start, count = self._groups[3 * (group - 1):3 * group]
+            if self._blob[self._offsets[sid]:self._offsets[sid + 1]] == data:
+                return list(self._postings[start:start + count])
+            slot = (slot + 1) & mask
+        return []
+
+    def lookup(
+        self, name: str, set_name: str | None = None, rarities: tuple[str, ...] = ()
+    ) -> tuple[str | None, str | None]:
+        # Same answers as deck.lookup_card: the set-qualified print first,
+        # then the newest print in one of the given rarities or with none.
+        rows = self.rows_named(name.lower())
+        set_col, number_col, rarity_col = (COLUMN_INDEX[c] for c in ("set_name", "number", "rarity"))
+        if set_name is not None:
+            for row in rows:
+                if self.value(row, set_col) == set_name.lower():
+                    return self.value(row, set_col), self.value(row, number_col)
+        for row in rows:
+            if not (rarity := self.value(row, rarity_col)) or rarity in rarities:
+                return self.value(row, set_col), self.value(row, number_col)
+        return None, None
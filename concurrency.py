@@ -0,0 +1,223 @@
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+
+class Saturated(Exception):
+    def __init__(self, eta_s: float):
+        super().__init__(f"all generation slots are busy, try again in about {eta_s:.0f}s")
+        self.eta_s = eta_s
+
+
+class GenerationLimiter:
+    """Bounds concurrent model calls and rejects requests once the wait list is full."""
+
+    def __init__(self, limit: int, max_waiting: int, expected_latency_s: float = 120.0):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.latency_s = expected_latency_s
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._sem = asyncio.Semaphore(limit)
+
+    def busy(self) -> bool:
+        return self._sem.locked()
+
+    def eta_s(self) -> float:
+        # Waiters are served in order, `limit` at a time.
+        return (self.waiting // self.limit + 1) * self.latency_s
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.busy() and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise Saturated(self.eta_s())
+        self.waiting += 1
+        try:
+            await self._sem.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            # Exponentially weighted, so the ETA follows the recent latency.
+            self.latency_s = 0.8 * self.latency_s + 0.2 * (time.monotonic() - started)
+            self._sem.release()
+
+
+def _consume(fut: asyncio.Future) -> None:
+    # A leader may fail with nobody waiting; mark the error as seen.
+    if not fut.cancelled():
+        fut.exception()
+
+
+class SingleFlight:
+    """Lets concurrent callers with the same key share one in-flight result."""
+
+    def __init__(self):
+        self.coalesced = 0
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def join(self, key: str) -> asyncio.Future | None:
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.coalesced += 1
+        return fut
+
+    @contextmanager
+    def lead(self, key: str):
+        fut = asyncio.get_running_loop().create_future()
+        fut.add_done_callback(_consume)
+        self._inflight[key] = fut
+        try:
+            yield fut
+        except (asyncio.CancelledError, GeneratorExit):
+            fut.cancel()
+            raise
+        except BaseException as exc:
+            if not fut.done():
+                fut.set_exception(exc)
+            raise
+        finally:
+            # Leaving without a result (e.g. the leader's client went away)
+            # cancels the future, and its followers take over in `wait`.
+            if not fut.done():
+                fut.cancel()
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+
+    async def wait(self, fut: asyncio.Future):
+        try:
+            return await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            if fut.cancelled() and not asyncio.current_task().cancelling():
+                return None
+            raise
+
+    async def do(self, key: str, fn, on_join=None):
+        while (fut := self.join(key)) is not None:
+            if on_join is not None:
+                on_join()
+            result = await self.wait(fut)
+            if result is not None:
+                return result
+        with self.lead(key) as fut:
+            result = await fn()
+            fut.set_result(result)
+            return result
+
+
+class Hedger:
+    """Races extra generations against a slow or invalid one; the first valid result wins."""
+
+    def __init__(
+        self,
+        max_extra: int = 1,
+        budget_ratio: float = 0.2,
+        percentile: float = 0.9,
+        default_delay_s: float = 90.0,
+        window: int = 200,
+        min_samples: int = 20,
+    ):
+        self.max_extra = max_extra
+        self.budget_ratio = budget_ratio
+        self.percentile = percentile
+        self.default_delay_s = default_delay_s
+        self.min_samples = min_samples
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.primary = 0
+        self.extra = 0
+        self.wins = 0
+
+    def delay_s(self) -> float:
+        if len(self.latencies) < self.min_samples:
+            return self.default_delay_s
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+
+    def _may_hedge(self, launched: int) -> bool:
+        # Extra calls are capped per request and as a share of all requests.
+        return launched <= self.max_extra and self.extra < self.budget_ratio * self.primary
+
+    async def _timed(self, launch):
+        started = time.monotonic()
+        result = await launch()
+        self.latencies.append(time.monotonic() - started)
+        return result
+
+    async def run(self, launch, is_valid, upfront: int = 1, can_hedge=lambda: True):
+        self.primary += 1
+        tasks = {asyncio.ensure_future(self._timed(launch))}
+        launched = 1
+        while launched < upfront and self._may_hedge(launched) and can_hedge():
+            tasks.add(asyncio.ensure_future(self._timed(launch)))
+            launched += 1
+            self.extra += 1
+
+        fallback, error = None, None
+        try:
+            while tasks:
+                hedge_open = self._may_hedge(launched)
+                done, tasks = await asyncio.wait(
+                    tasks,
+                    timeout=self.delay_s() if hedge_open else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    result = task.result()
+                    if is_valid(result):
+                        if launched > 1:
+                            self.wins += 1
+                        return result
+                    if fallback is None:
+                        fallback = result
+                # Hedge when the deadline passes, or when every call so far
+                # came back unusable.
+                if (not done or not tasks) and self._may_hedge(launched) and can_hedge():
+                    tasks.add(asyncio.ensure_future(self._timed(launch)))
+                    launched += 1
+                    self.extra += 1
+        finally:
+            for task in tasks:
+                task.cancel()
+        if fallback is not None or error is None:
+            return fallback
+        raise error
+
+
+class RateLimiter:
+    """Spaces calls out to at most `rate` per second, allowing bursts of `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        # Callers queue on the lock, so tokens go out in arrival order.
+        async with self._lock:
+            while True:
+                now = self.clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def backoff_s(attempt: int, base_s: float = 2.0, cap_s: float = 120.0) -> float:
+    """Full-jitter exponential backoff before retry number `attempt` (from 1)."""
+    return random.uniform(0, min(cap_s, base_s * 2 ** (attempt - 1)))
@@ -0,0 +1,118 @@
+import hashlib
+import sys
+import threading
+import time
+
+from google.genai import types
+
+
+def prompt_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class SystemPromptCache:
+    """Keeps one server-side cached-content handle per system prompt.
+
+    The client only needs ``caches.create``, ``caches.update`` and
+    ``caches.delete``, so a local fake can stand in for ``genai.Client``.
+    """
+
+    def __init__(
+        self,
+        client,
+        model: str,
+        ttl_s: int = 3600,
+        refresh_margin_s: int = 300,
+        retry_after_s: int = 600,
+        max_handles: int = 4,
+        clock=time.time,
+    ):
+        self.client = client
+        self.model = model
+        self.ttl_s = ttl_s
+        self.refresh_margin_s = refresh_margin_s
+        self.retry_after_s = retry_after_s
+        self.max_handles = max_handles
+        self.clock = clock
+        self._handles: dict[str, tuple[str, float]] = {}
+        # Prompt hash -> when to try caching it again after a failure, so a
+        # prompt the API won't cache (e.g. too small) doesn't stop the others.
+        self._disabled_until: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _expiry(self, cached) -> float:
+        expire_time = getattr(cached, "expire_time", None)
+        if expire_time is not None:
+            return expire_time.timestamp()
+        return self.clock() + self.ttl_s
+
+    def _create(self, text: str, key: str) -> tuple[str, float]:
+        cached = self.client.caches.create(
+            model=self.model,
+            config=types.CreateCachedContentConfig(
+                system_instruction=text,
+                display_name=f"system-{key[:12]}",
+                ttl=f"{self.ttl_s}s",
+            ),
+        )
+        return cached.name, self._expiry(cached)
+
+    def _refresh(self, name: str) -> tuple[str, float]:
+        cached = self.client.caches.update(
+            name=name,
+            config=types.UpdateCachedContentConfig(ttl=f"{self.ttl_s}s"),
+        )
+        return name, self._expiry(cached)
+
+    def _drop(self, name: str) -> None:
+        try:
+            self.client.caches.delete(name=name)
+        except Exception:
+            pass
+
+    def handle(self, text: str) -> str | None:
+        key = prompt_hash(text)
+        with self._lock:
+            now = self.clock()
+            if now < self._disabled_until.get(key, 0.0):
+                return None
+            try:
+                if key in self._handles:
+                    name, expires_at = self._handles[key]
+                    if expires_at - now > self.refresh_margin_s:
+                        return name
+                    try:
+                        self._handles[key] = self._refresh(name)
+                    except Exception:
+                        self._handles[key] = self._create(text, key)
+                else:
+                    # A new prompt hash (system.txt was regenerated); the
+                    # oldest handles are only costing storage by now.
+                    while len(self._handles) >= self.max_handles:
+                        self._drop(self._handles.pop(next(iter(self._handles)))[0])
+                    self._handles[key] = self._create(text, key)
+                self._disabled_until.pop(key, None)
+            except Exception as exc:
+                sys.stderr.write(f"[WARN] Context caching unavailable: {exc}\n")
+                self._handles.pop(key, None)
+                self._disabled_until[key] = now + self.retry_after_s
+                return None
+            return self._handles[key][0]
+
+    def invalidate(self, text: str) -> None:
+        """Forgets a handle the API rejected and sends the prompt inline for a while."""
+        key = prompt_hash(text)
+        with self._lock:
+            entry = self._handles.pop(key, None)
+            # Re-creating straight away could hand out a handle that is
+            # rejected the same way on the next request.
+            self._disabled_until[key] = self.clock() + self.retry_after_s
+        if entry is not None:
+            self._drop(entry[0])
+
+    def config(self, text: str) -> dict:
+        # Keyword arguments for GenerateContentConfig: the cached handle when
+        # there is one, otherwise the prompt itself.
+        if (name := self.handle(text)) is not None:
+            return {"cached_content": name}
+        return {"system_instruction": text}
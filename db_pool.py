@@ -0,0 +1,83 @@
+import os
+import sqlite3
+import threading
+from urllib.parse import quote
+
+MMAP_BYTES = 256 * 1024 * 1024
+CACHE_KIB = 64 * 1024
+# Python's sqlite3 keeps this many prepared statements per connection, keyed
+# by SQL text, so repeated queries skip the prepare step.
+CACHED_STATEMENTS = 256
+
+
+class ReadOnlyPool:
+    """One read-only connection per thread to a database that never changes at runtime.
+
+    ``immutable=1`` tells SQLite the file cannot change underneath it, so it
+    skips locking and change detection entirely. Only use it on a database
+    that is not rebuilt while the app is running (it is baked into the image).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        immutable: bool = True,
+        mmap_bytes: int = MMAP_BYTES,
+        cache_kib: int = CACHE_KIB,
+        cached_statements: int = CACHED_STATEMENTS,
+    ):
+        self.path = os.path.abspath(path)
+        self.immutable = immutable
+        self.mmap_bytes = mmap_bytes
+        self.cache_kib = cache_kib
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all: list[sqlite3.Connection] = []
+
+    def _uri(self) -> str:
+        uri = f"file:{quote(self.path)}?mode=ro"
+        return uri + "&immutable=1" if self.immutable else uri
+
+    def _open(self) -> sqlite3.Connection:
+        # Each connection stays on its own thread; check_same_thread is off
+        # only so close() can be called from whichever thread shuts down.
+        conn = sqlite3.connect(
+            self._uri(), uri=True, cached_statements=self.cached_statements, check_same_thread=False
+        )
+        conn.execute(f"PRAGMA mmap_size = {self.mmap_bytes}")
+        conn.execute(f"PRAGMA cache_size = -{self.cache_kib}")
+        conn.execute("PRAGMA query_only = ON")
+        with self._lock:
+            self._all.append(conn)
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._open()
+        return conn
+
+    def cursor(self) -> sqlite3.Cursor:
+        return self.connection().cursor()
+
+    def close(self) -> None:
+        # Only safe once no thread is using its connection any more.
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+        self._local = threading.local()
+
+
+_pools: dict[str, ReadOnlyPool] = {}
+_pools_lock = threading.Lock()
+
+
+def read_only(path: str) -> ReadOnlyPool:
+    """Returns the shared pool for a database path, creating it on first use."""
+    key = os.path.abspath(path)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ReadOnlyPool(path)
+        return _pools[key]
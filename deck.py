@@ -0,0 +1,170 @@
+import sqlite3
+import sys
+
+from cardstore import CardStore
+from db_pool import read_only
+from ext import PREFERRED_RARITIES
+from metrics import REGISTRY, timed
+from resolver import CardResolver, Match, alias_candidates
+from rules import display_number
+
+unresolved_cards = REGISTRY.counter(
+    "tcg_unresolved_cards_total", "Deck entries that matched no card in the DB, by category."
+)
+fuzzy_matches = REGISTRY.counter("tcg_fuzzy_matches_total", "Deck entries matched by fuzzy name, by category.")
+
+
+@timed("lookup_card")
+def lookup_card(name: str, cur: sqlite3.Cursor, *, set_name: str | None = None):
+    if set_name is not None:
+        cur.execute(
+            """
+            SELECT set_name, number
+            FROM cards
+            WHERE name = ? AND set_name = ?
+            ORDER BY
+                regulation IS NULL,
+                regulation DESC
+            """,
+            (name.lower(), set_name.lower()),
+        )
+        if rows := cur.fetchall():
+            return rows[0]
+
+    cur.execute(
+        """
+        SELECT set_name, number
+        FROM cards
+        WHERE name = ?
+          AND (rarity IS NULL
+               OR rarity IN ('', 'common','uncommon','ace spec rare',
+                             'rare','rare holo','double rare'))
+        ORDER BY
+            regulation IS NULL,
+            regulation DESC
+        """,
+        (name.lower(),),
+    )
+    rows = cur.fetchall()
+    return rows[0] if rows else (None, None)
+
+
+RESOLVE_SQL = """
+    WITH requested(pos, pref, kind, alias) AS (VALUES {values})
+    SELECT r.pos, a.set_name, a.number
+    FROM requested r
+    JOIN card_aliases a ON a.kind = r.kind AND a.alias = r.alias
+    ORDER BY r.pos, r.pref
+"""
+# The VALUES list is padded to a multiple of this many rows so decks of
+# similar size share one cached prepared statement.
+RESOLVE_ROWS_STEP = 16
+
+
+def resolve_aliases(entries: list[tuple[str, str]], cur: sqlite3.Cursor) -> dict[int, Match]:
+    params: list = []
+    for pos, (raw_name, category) in enumerate(entries):
+        for pref, (kind, alias) in enumerate(alias_candidates(raw_name, category)):
+            params += (pos, pref, kind, alias)
+    if not params:
+        return {}
+    rows = len(params) // 4
+    padded = -(-rows // RESOLVE_ROWS_STEP) * RESOLVE_ROWS_STEP
+    # Padding rows match no alias.
+    params += (-1, 0, "", "") * (padded - rows)
+    values = ",".join(["(?,?,?,?)"] * padded)
+    resolved: dict[int, Match] = {}
+    for pos, set_name, number in cur.execute(RESOLVE_SQL.format(values=values), params):
+        resolved.setdefault(pos, Match(set_name, number, entries[pos][0], False))
+    return resolved
+
+
+def fix_name(raw_name: str, category: str, match: Match) -> tuple[str, str, str]:
+    if match.fuzzy:
+        fuzzy_matches.inc(category=category)
+        sys.stderr.write(f"[INFO] Matched {raw_name!r} to {match.name!r}\n")
+        raw_name = match.name
+    return match.set_name, match.number, raw_name
+
+
+@timed("compile_deck")
+def compile_deck(
+    deck_dict: dict,
+    db_path: str = "pokemon_cards.db",
+    resolver: CardResolver | None = None,
+    store: CardStore | None = None,
+) -> dict:
+    groups: dict[str, list[tuple]] = {"Pokemon": [], "Trainer": [], "Energy": []}
+
+    entries = [(raw_name, category) for raw_name, (_, category) in deck_dict.items()]
+    if resolver is not None:
+        cur = None
+        resolved = {
+            pos: match
+            for pos, (raw_name, category) in enumerate(entries)
+            if (match := resolver.resolve(raw_name, category)) is not None
+        }
+    else:
+        # A per-thread read-only connection, kept open between requests.
+        cur = read_only(db_path).cursor()
+        resolved = resolve_aliases(entries, cur)
+
+    for pos, (raw_name, (count, category)) in enumerate(deck_dict.items()):
+        if category == "Pokemon":
+            *card_name_parts, set_tag = raw_name.split()
+            card_name = " ".join(card_name_parts)
+            if pos in resolved:
+                set_name, number, raw_name = fix_name(raw_name, category, resolved[pos])
+                if raw_name.split()[-1].isdigit():
+                    # The number is printed from the resolved row, after the set code.
+                    raw_name = raw_name.rsplit(" ", 1)[0]
+            elif set_tag.isdigit():
+                # "Name SET NUM" that no alias matched; keep it as written.
+                groups[category].append((count, raw_name, "", ""))
+                continue
+            elif cur is not None:
+                set_name, number = lookup_card(card_name, cur, set_name=set_tag)
+            elif store is not None:
+                set_name, number = store.lookup(card_name, set_name=set_tag, rarities=PREFERRED_RARITIES)
+            else:
+                set_name, number = None, None
+            if set_name is None:
+                unresolved_cards.inc(category=category)
+
+        elif category in ("Trainer", "Energy"):
+            if pos not in resolved:
+                sys.stderr.write(f"[WARN] No DB entry for {raw_name!r}\n")
+                unresolved_cards.inc(category=category)
+                continue
+            set_name, number, raw_name = fix_name(raw_name, category, resolved[pos])
+
+        else:
+            continue
+
+        groups[category].append((count, raw_name, set_name, display_number(number)))
+
+    return groups
+
+
+@timed("format_deck")
+def format_deck(groups: dict, comment: str) -> tuple[str, str]:
+    lines: list[str] = []
+    total = 0
+    for cat in ("Pokemon", "Trainer", "Energy"):
+        entries = groups.get(cat, [])
+        if not entries:
+            continue
+        subtotal = sum(e[0] for e in entries)
+        total += subtotal
+        lines.append(f"{cat} - {subtotal}")
+        for cnt, name, set_name, num in entries:
+            if set_name:
+                pretty_name = name[:-4] if name[-3:].isupper() else name
+                lines.append(
+                    f"{cnt} {pretty_name} {set_name.upper()} {num}".replace("  ", " ")
+                )
+            else:
+                lines.append(f"{cnt} {name}")
+        lines.append("")
+    lines.append(f"Total - {total}")
+    return "\n".join(lines), comment
@@ -1,10 +1,33 @@
 import os
+import re
 import json
+import time
+import hashlib
 import sqlite3
+import argparse
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+from cardstore import write_store
 
 SETS_PATH = 'pokemon-tcg-data/sets/en.json'
 CARDS_DIR = 'pokemon-tcg-data/cards/en'
 DB_PATH = 'pokemon_cards.db'
+# Columnar copy of the cards table that app.py and short.py can mmap.
+STORE_PATH = 'pokemon_cards.bin'
+INSERT_BATCH_SIZE = 5000
+BUILD_CACHE_KIB = 256 * 1024
+# Bump whenever the tables below change shape; --incremental falls back to
+# a full rebuild when the database was written with another version.
+SCHEMA_VERSION = 2
+# Set codes as the prompt spells them (see short.format_card_name).
+PROMO_SET_CODES = [('PROMO_SWSH', 'SP'), ('PR-SW', 'SP'), ('PR-SM', 'SMP'), ('PR-SV', 'SVP')]
+# Rarities deck.lookup_card accepts when a card is looked up by name alone.
+PREFERRED_RARITIES = ('common', 'uncommon', 'ace spec rare',
+                      'rare', 'rare holo', 'double rare')
+PARENS_RE = re.compile(r'\(.*?\)')
+# Rarities that mark an ACE SPEC on sets printed before the subtype existed.
+ACE_SPEC_RARITIES = ('ace spec rare', 'rare ace')
 
 def create_connection(db_path):
     conn = sqlite3.connect(db_path)
@@ -17,9 +40,31 @@ def create_table(conn):
         DROP TABLE IF EXISTS cards
         '''
     )
+    cursor.execute(
+        '''
+        DROP TABLE IF EXISTS sets
+        '''
+    )
+    cursor.execute(
+        '''
+        DROP TABLE IF EXISTS manifest
+        '''
+    )
+    cursor.execute(
+        '''
+        CREATE TABLE sets (
+            id TEXT PRIMARY KEY,
+            code TEXT,
+            name TEXT,
+            series TEXT,
+            release_date TEXT
+        )
+        '''
+    )
     cursor.execute(
         '''
         CREATE TABLE cards (
+            id TEXT PRIMARY KEY,
             name TEXT,
             set_name TEXT,
             types TEXT,
@@ -34,11 +79,144 @@ def create_table(conn):
             card_type TEXT,
             vstar_power TEXT,
             regulation TEXT,
-            series TEXT
+            series TEXT REFERENCES sets (id),
+            source TEXT,
+            is_ace_spec INTEGER,
+            is_radiant INTEGER,
+            is_rule_box INTEGER,
+            is_basic_energy INTEGER
+        )
+        '''
+    )
+    cursor.execute(
+        '''
+        CREATE TABLE manifest (
+            path TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime REAL,
+            sha256 TEXT
         )
         '''
     )
+    cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    conn.commit()
+
+def create_indexes(conn):
+    cursor = conn.cursor()
+    # deck.lookup_card: name + set tag, newest regulation first.
+    # Carries number so the lookup is answered from the index alone.
+    cursor.execute(
+        '''
+        CREATE INDEX IF NOT EXISTS idx_cards_name_set
+        ON cards (name, set_name, regulation, number)
+        '''
+    )
+    # deck.lookup_card fallback: name + rarity whitelist, newest regulation first.
+    cursor.execute(
+        '''
+        CREATE INDEX IF NOT EXISTS idx_cards_name_rarity
+        ON cards (name, rarity, regulation, set_name, number)
+        '''
+    )
+    cursor.execute(
+        '''
+        CREATE INDEX IF NOT EXISTS idx_cards_series
+        ON cards (series)
+        '''
+    )
+    cursor.execute(
+        '''
+        CREATE INDEX IF NOT EXISTS idx_cards_source
+        ON cards (source)
+        '''
+    )
+    cursor.execute('ANALYZE')
+    conn.commit()
+
+def display_set_code(set_name):
+    code = set_name.upper()
+    for long_code, short_code in PROMO_SET_CODES:
+        code = code.replace(long_code, short_code)
+    return code
+
+def build_aliases(conn):
+    # Maps every name form the prompt can emit to the card compile_deck
+    # should pick for it, so a whole deck resolves with a single query.
+    cursor = conn.cursor()
+    cursor.execute(
+        '''
+        DROP TABLE IF EXISTS card_aliases
+        '''
+    )
+    cursor.execute(
+        '''
+        CREATE TABLE card_aliases (
+            kind TEXT,
+            alias TEXT,
+            card_id TEXT,
+            set_name TEXT,
+            number TEXT,
+            PRIMARY KEY (kind, alias)
+        ) WITHOUT ROWID
+        '''
+    )
+    cursor.execute(
+        '''
+        SELECT id, name, set_name, number, rarity, card_type
+        FROM cards
+        ORDER BY regulation DESC, set_name, CAST(number AS INTEGER)
+        '''
+    )
+    # Rows arrive newest regulation first, so among candidates of equal
+    # rank the first one seen wins, matching deck.lookup_card.
+    best = {}
+    for card_id, name, set_name, number, rarity, card_type in cursor:
+        # Forms looked up by name alone prefer the rarities lookup_card
+        # accepts, which include none at all (stored as ''); set-qualified
+        # forms go by regulation only.
+        rarity_rank = 0 if not rarity or rarity in PREFERRED_RARITIES else 1
+        if card_type == 'pokemon':
+            kind = 'pokemon'
+            code = display_set_code(set_name).lower()
+            digits = ''.join(filter(str.isdigit, number)).lstrip('0')
+            # The bare name stands in for lookup_card's name-only fallback.
+            forms = [(f'{name} {code}', (0, 0)),
+                     (f'{name} {code} {digits}', (0, 0)),
+                     (name, (1, rarity_rank))]
+        else:
+            kind = 'trainer'
+            stripped = ' '.join(PARENS_RE.sub('', name).split())
+            forms = [(name, (0, rarity_rank)), (stripped, (1, rarity_rank))]
+        for alias, rank in forms:
+            key = (kind, alias)
+            if key not in best or rank < best[key][0]:
+                best[key] = (rank, card_id, set_name, number)
+    cursor.executemany(
+        'INSERT INTO card_aliases VALUES (?,?,?,?,?)',
+        [(kind, alias, card_id, set_name, number)
+         for (kind, alias), (_, card_id, set_name, number) in best.items()]
+    )
     conn.commit()
+    return len(best)
+
+def insert_sets(conn, sets):
+    rows = [(s['id'], s.get('ptcgoCode', '').lower(), s.get('name', ''),
+             s.get('series', ''), s.get('releaseDate', ''))
+            for s in sets]
+    conn.executemany('INSERT INTO sets VALUES (?,?,?,?,?)', rows)
+    conn.commit()
+
+def rule_flags(card, card_type, rarity):
+    # Deck-building limits (see rules.py) keyed off subtypes, so the app
+    # never has to parse rarity names or rule text at request time.
+    subtypes = [t.lower() for t in card.get('subtypes', [])]
+    is_ace_spec = 'ace spec' in subtypes or rarity in ACE_SPEC_RARITIES
+    is_radiant = 'radiant' in subtypes
+    # Rule-box Pokemon (ex, V, GX, Radiant, ...) are the ones printed with rules.
+    is_rule_box = card_type == 'pokemon' and bool(card.get('rules'))
+    is_basic_energy = card_type == 'energy' and 'basic' in subtypes
+    return (int(is_ace_spec), int(is_radiant), int(is_rule_box),
+            int(is_basic_energy))
 
 def process_card(card, assoc):
     name = card.get('name', '').lower()
@@ -94,46 +272,184 @@ def process_card(card, assoc):
     rarity = card.get('rarity', '').lower()
     regulation = card.get('regulationMark', '').lower()
 
-    return (name, set_name, types, number.lower(), hp, effect,
+    return (card_id, name, set_name, types, number.lower(), hp, effect,
             abilities, attacks, retreat, evolve_from, rarity,
             card_type, vstar_power, regulation, set_id)
 
-def main():
+def parse_card_file(file_path, assoc):
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    cards = json.loads(data)
+    source = os.path.basename(file_path)
+    rows = []
+    for card in cards:
+        card_id = card.get('id', '')
+        set_id = card_id.split('-')[0] if '-' in card_id else ''
+        if set_id not in assoc:
+            continue
+        row = process_card(card, assoc)
+        rows.append(row + (source,) + rule_flags(card, row[12], row[11]))
+    return rows, hashlib.sha256(data).hexdigest()
+
+def parse_card_files(file_paths, assoc, workers):
+    if workers <= 1:
+        for file_path in file_paths:
+            yield parse_card_file(file_path, assoc)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(partial(parse_card_file, assoc=assoc), file_paths)
+
+def set_build_pragmas(conn):
+    # The database is a build artifact that is simply rebuilt if a run
+    # fails, so durability is traded for speed while it is written.
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute(f'PRAGMA cache_size = -{BUILD_CACHE_KIB}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+
+def insert_cards(conn, rows):
+    for i in range(0, len(rows), INSERT_BATCH_SIZE):
+        conn.executemany(
+            '''
+            INSERT OR REPLACE INTO cards VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+            ''',
+            rows[i:i + INSERT_BATCH_SIZE]
+        )
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def record_file(conn, path, digest):
+    st = os.stat(path)
+    conn.execute('INSERT OR REPLACE INTO manifest VALUES (?,?,?,?)',
+                 (path, st.st_size, st.st_mtime, digest))
+
+def can_update_incrementally(conn, sets_digest):
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version != SCHEMA_VERSION:
+        return False
+    row = conn.execute('SELECT sha256 FROM manifest WHERE path = ?',
+                       (SETS_PATH,)).fetchone()
+    # Every row embeds set codes from en.json, so a changed sets file
+    # invalidates the whole table.
+    return row is not None and row[0] == sets_digest
+
+def diff_manifest(conn, file_paths):
+    known = {path: (size, mtime, digest) for path, size, mtime, digest in
+             conn.execute('SELECT path, size, mtime, sha256 FROM manifest')}
+    changed = []
+    for path in file_paths:
+        if path not in known:
+            changed.append(path)
+            continue
+        size, mtime, digest = known[path]
+        st = os.stat(path)
+        if st.st_size == size and st.st_mtime == mtime:
+            continue
+        # Size or mtime moved; only the hash says whether the content did.
+        if st.st_size == size and file_digest(path) == digest:
+            record_file(conn, path, digest)
+            continue
+        changed.append(path)
+    current = set(file_paths)
+    removed = [path for path in known
+               if path != SETS_PATH and path not in current]
+    return changed, removed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build pokemon_cards.db from pokemon-tcg-data.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='processes used to parse card files (1 parses in-process)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only re-parse card files that changed since the last run')
+    args = parser.parse_args(argv)
+
     if not os.path.exists(SETS_PATH) or not os.path.isdir(CARDS_DIR):
         print("The dataset folder 'pokemon-tcg-data' was not found. "
               "Please upload it and try again.")
         return
-    
-    with open(SETS_PATH, 'r', encoding='utf-8') as f:
-        sets = json.load(f)
+
+    timings = {}
+    started = time.perf_counter()
+
+    with open(SETS_PATH, 'rb') as f:
+        sets_data = f.read()
+    sets = json.loads(sets_data)
+    sets_digest = hashlib.sha256(sets_data).hexdigest()
     assoc = {s['id']: s['ptcgoCode'].lower()
              for s in sets if 'ptcgoCode' in s}
 
+    file_paths = [os.path.join(CARDS_DIR, filename)
+                  for filename in sorted(os.listdir(CARDS_DIR))]
+
     conn = create_connection(DB_PATH)
-    create_table(conn)
-    cursor = conn.cursor()
+    incremental = args.incremental and can_update_incrementally(conn, sets_digest)
+    if incremental:
+        # Unlike a full build, an interrupted update must not leave a
+        # corrupt file behind, so the rollback journal stays on.
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute(f'PRAGMA cache_size = -{BUILD_CACHE_KIB}')
+        to_parse, removed = diff_manifest(conn, file_paths)
+    else:
+        if args.incremental:
+            print("No usable manifest for the current schema and sets file, "
+                  "doing a full rebuild.")
+        set_build_pragmas(conn)
+        create_table(conn)
+        insert_sets(conn, sets)
+        record_file(conn, SETS_PATH, sets_digest)
+        to_parse, removed = file_paths, []
+    timings['sets'] = time.perf_counter() - started
 
-    total_inserted = 0
-    for filename in os.listdir(CARDS_DIR):
-        file_path = os.path.join(CARDS_DIR, filename)
-        with open(file_path, 'r', encoding='utf-8') as f:
-            cards = json.load(f)
-        for card in cards:
-            card_id = card.get('id', '')
-            set_id = card_id.split('-')[0] if '-' in card_id else ''
-            if set_id not in assoc:
-                continue
-            row = process_card(card, assoc)
-            cursor.execute(
-                '''
-                INSERT INTO cards VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-                ''',
-                row
-            )
-            total_inserted += 1
+    for path in removed:
+        conn.execute('DELETE FROM cards WHERE source = ?', (os.path.basename(path),))
+        conn.execute('DELETE FROM manifest WHERE path = ?', (path,))
 
+    # Each file's rows are inserted as soon as a worker hands them back,
+    # so parsing in the pool overlaps with inserting here.
+    total_inserted = 0
+    insert_time = 0.0
+    stage_start = time.perf_counter()
+    results = parse_card_files(to_parse, assoc, args.workers)
+    for path, (rows, digest) in zip(to_parse, results):
+        insert_start = time.perf_counter()
+        if incremental:
+            conn.execute('DELETE FROM cards WHERE source = ?', (os.path.basename(path),))
+        insert_cards(conn, rows)
+        record_file(conn, path, digest)
+        insert_time += time.perf_counter() - insert_start
+        total_inserted += len(rows)
     conn.commit()
+    timings['parse'] = time.perf_counter() - stage_start - insert_time
+    timings['insert'] = insert_time
+
+    stage_start = time.perf_counter()
+    total_aliases = build_aliases(conn)
+    timings['aliases'] = time.perf_counter() - stage_start
+
+    stage_start = time.perf_counter()
+    create_indexes(conn)
+    timings['index'] = time.perf_counter() - stage_start
+
+    stage_start = time.perf_counter()
+    write_store(conn, STORE_PATH)
     conn.close()
-    print(f"Database created at {DB_PATH} with {total_inserted} cards.")
+    timings['store'] = time.perf_counter() - stage_start
+    timings['total'] = time.perf_counter() - started
+
+    if incremental:
+        print(f"Database updated at {DB_PATH}: {total_inserted} cards from "
+              f"{len(to_parse)} changed files, {len(removed)} files removed "
+              f"({args.workers} workers).")
+    else:
+        print(f"Database created at {DB_PATH} with {total_inserted} cards "
+              f"from {len(file_paths)} files ({args.workers} workers).")
+    print(f"Built {total_aliases} name aliases.")
+    print(f"Card store written to {STORE_PATH}.")
+    for stage, seconds in timings.items():
+        print(f"  {stage:<8}{seconds:8.3f}s")
+    return timings
 
-main()
+if __name__ == '__main__':
+    main()
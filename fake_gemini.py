@@ -0,0 +1,272 @@
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+
+from synth import canned_recipes
+
+# Used when there is no card database to draw recipes from.
+FALLBACK_RECIPE = {
+    "Deck": [
+        {"count": 4, "name": "Pikachu ex SV8", "category": "Pokemon"},
+        {"count": 4, "name": "Iono", "category": "Trainer"},
+        {"count": 4, "name": "Nest Ball", "category": "Trainer"},
+        {"count": 12, "name": "Lightning Energy", "category": "Energy"},
+    ],
+    "Comment": "Name:\nFake Lightning",
+}
+
+
+class FakeModel(NamedTuple):
+    """
+    How the fake server behaves. Latency is log-normal around latency_s;
+    streamed responses send their first chunk after first_chunk_share of it.
+    """
+    latency_s: float = 60.0
+    latency_sigma: float = 0.35
+    first_chunk_share: float = 0.7
+    chunk_chars: int = 80
+    error_rate: float = 0.0
+    error_status: int = 503
+    thinking_tokens: int = 6000
+
+
+def recipe_texts(db_path: str, count: int = 200, seed: int = 0) -> list[str]:
+    if not os.path.exists(db_path):
+        return [json.dumps(FALLBACK_RECIPE)]
+    texts = []
+    for i, recipe in enumerate(canned_recipes(db_path, count, seed)):
+        deck = [{"count": n, "name": name, "category": category} for name, (n, category) in recipe.items()]
+        texts.append(json.dumps({"Deck": deck, "Comment": f"Name:\nSynthetic deck {i}\n\nStrategy:\nLoad test."}))
+    return texts
+
+
+def rfc3339(seconds_from_now: float) -> str:
+    moment = datetime.now(timezone.utc) + timedelta(seconds=seconds_from_now)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def parse_ttl(body: dict, default_s: float = 3600) -> float:
+    ttl = body.get("ttl") or ""
+    return float(ttl[:-1]) if ttl.endswith("s") else default_s
+
+
+class FakeGemini(ThreadingHTTPServer):
+    """Answers the Gemini REST calls app.py makes, without a model behind them."""
+
+    daemon_threads = True
+    # The default listen backlog of 5 resets connections under load.
+    request_queue_size = 1024
+
+    def __init__(self, address: tuple[str, int], model: FakeModel, recipes: list[str], seed: int = 0):
+        super().__init__(address, Handler)
+        self.model = model
+        self.recipes = recipes
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.caches: dict[str, dict] = {}
+        self.served = {"generate": 0, "stream": 0, "errors": 0}
+
+    def sample(self) -> tuple[float, bool, str]:
+        # One lock around the shared RNG keeps runs with a seed repeatable.
+        with self.lock:
+            latency = self.model.latency_s * math.exp(self.rng.gauss(0, self.model.latency_sigma))
+            failed = self.rng.random() < self.model.error_rate
+            return latency, failed, self.rng.choice(self.recipes)
+
+    def count(self, outcome: str) -> None:
+        with self.lock:
+            self.served[outcome] += 1
+
+    def usage(self, request_bytes: int, text: str) -> dict:
+        # Roughly four characters per token.
+        prompt = request_bytes // 4
+        output = len(text) // 4
+        return {
+            "promptTokenCount": prompt,
+            "candidatesTokenCount": output,
+            "thoughtsTokenCount": self.model.thinking_tokens,
+            "totalTokenCount": prompt + output + self.model.thinking_tokens,
+        }
+
+
+class Handler(BaseHTTPRequestHandler):
+    server: FakeGemini
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _json(self, status: int, payload: dict) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status: int, message: str) -> None:
+        names = {400: "INVALID_ARGUMENT", 404: "NOT_FOUND", 429: "RESOURCE_EXHAUSTED",
+                 500: "INTERNAL", 503: "UNAVAILABLE"}
+        self._json(status, {"error": {"code": status, "message": message, "status": names.get(status, "UNKNOWN")}})
+
+    def _candidate(self, text: str, finished: bool) -> dict:
+        candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+        if finished:
+            candidate["finishReason"] = "STOP"
+        return candidate
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0]
+        body = self._body()
+        if path.endswith(":generateContent"):
+            self._generate(len(body))
+        elif path.endswith(":streamGenerateContent"):
+            self._stream(len(body))
+        elif path.endswith("/cachedContents"):
+            self._create_cache(json.loads(body or b"{}"))
+        else:
+            self._error(404, f"No fake for POST {path}")
+
+    def do_PATCH(self):
+        name = self.path.split("?", 1)[0].split("/v1beta/", 1)[-1]
+        body = json.loads(self._body() or b"{}")
+        with self.server.lock:
+            cached = self.server.caches.get(name)
+            if cached is not None:
+                cached["expireTime"] = rfc3339(parse_ttl(body))
+        if cached is None:
+            self._error(404, f"{name} not found")
+        else:
+            self._json(200, cached)
+
+    def do_DELETE(self):
+        name = self.path.split("?", 1)[0].split("/v1beta/", 1)[-1]
+        with self.server.lock:
+            self.server.caches.pop(name, None)
+        self._json(200, {})
+
+    def _create_cache(self, body: dict) -> None:
+        name = f"cachedContents/{uuid.uuid4().hex[:12]}"
+        cached = {
+            "name": name,
+            "model": body.get("model", ""),
+            "displayName": body.get("displayName", ""),
+            "createTime": rfc3339(0),
+            "updateTime": rfc3339(0),
+            "expireTime": rfc3339(parse_ttl(body)),
+            "usageMetadata": {"totalTokenCount": len(json.dumps(body)) // 4},
+        }
+        with self.server.lock:
+            self.server.caches[name] = cached
+        self._json(200, cached)
+
+    def _generate(self, request_bytes: int) -> None:
+        latency, failed, text = self.server.sample()
+        time.sleep(latency)
+        if failed:
+            self.server.count("errors")
+            self._error(self.server.model.error_status, "Injected failure")
+            return
+        self.server.count("generate")
+        self._json(200, {
+            "candidates": [self._candidate(text, True)],
+            "usageMetadata": self.server.usage(request_bytes, text),
+            "modelVersion": "fake",
+        })
+
+    def _stream(self, request_bytes: int) -> None:
+        model = self.server.model
+        latency, failed, text = self.server.sample()
+        first_chunk_s = latency * model.first_chunk_share
+        time.sleep(first_chunk_s)
+        if failed:
+            self.server.count("errors")
+            self._error(model.error_status, "Injected failure")
+            return
+        self.server.count("stream")
+        chunks = [text[i:i + model.chunk_chars] for i in range(0, len(text), model.chunk_chars)]
+        gap_s = (latency - first_chunk_s) / max(1, len(chunks) - 1)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(gap_s)
+            last = i == len(chunks) - 1
+            payload = {"candidates": [self._candidate(chunk, last)], "modelVersion": "fake"}
+            if last:
+                payload["usageMetadata"] = self.server.usage(request_bytes, text)
+            event = f"data: {json.dumps(payload)}\r\n\r\n".encode("utf-8")
+            self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def start(model: FakeModel, host: str = "127.0.0.1", port: int = 0,
+          db_path: str = "pokemon_cards.db", seed: int = 0) -> FakeGemini:
+    """Serves the fake API from a background thread; port 0 picks a free port."""
+    server = FakeGemini((host, port), model, recipe_texts(db_path, seed=seed), seed)
+    threading.Thread(target=server.serve_forever, name="fake-gemini", daemon=True).start()
+    return server
+
+
+def add_model_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = FakeModel()
+    parser.add_argument("--latency", type=float, default=defaults.latency_s,
+                        help="median seconds per response")
+    parser.add_argument("--latency-sigma", type=float, default=defaults.latency_sigma,
+                        help="spread of the log-normal latency (0 for a fixed latency)")
+    parser.add_argument("--first-chunk-share", type=float, default=defaults.first_chunk_share,
+                        help="share of the latency spent before the first streamed chunk")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate,
+                        help="share of calls that fail")
+    parser.add_argument("--error-status", type=int, default=defaults.error_status,
+                        help="HTTP status of failed calls (429 or 503 are typical)")
+
+
+def model_from_args(args) -> FakeModel:
+    return FakeModel(
+        latency_s=args.latency,
+        latency_sigma=args.latency_sigma,
+        first_chunk_share=args.first_chunk_share,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serve a stand-in for the Gemini API; point app.py at it with GEMINI_BASE_URL."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--db", default="pokemon_cards.db", help="card database to draw recipes from")
+    parser.add_argument("--seed", type=int, default=0)
+    add_model_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = FakeGemini((args.host, args.port), model_from_args(args), recipe_texts(args.db, seed=args.seed), args.seed)
+    sys.stderr.write(f"[INFO] Fake Gemini API on http://{args.host}:{server.server_port}\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from typing import NamedTuple
+
+from gradio_client import Client
+from gradio_client.utils import Status
+
+import fake_gemini
+
+# Requests that ask for the same deck, so the response cache and request
+# coalescing get exercised when --repeat-share is above zero.
+REPEATED_PROMPTS = [
+    "Fast lightning deck around Pikachu and Raichu",
+    "Control deck with lots of switching and disruption",
+    "Fire aggro deck that takes prizes early",
+]
+POLL_S = 0.02
+
+
+class Sample(NamedTuple):
+    started: float
+    latency_s: float
+    queue_s: float | None
+    first_output_s: float | None
+    outcome: str
+
+
+def percentile(values: list[float], pct: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def classify(outputs, exc: Exception | None) -> str:
+    # The streaming handler reports capacity in the comment box instead of raising.
+    text = str(exc) if exc is not None else " ".join(str(o) for o in outputs or ())
+    if "at capacity" in text:
+        return "rejected"
+    if exc is not None:
+        return "error"
+    return "ok"
+
+
+def one_request(client, characteristics: str, fresh: bool, fmt: str) -> Sample:
+    started = time.perf_counter()
+    queue_s = first_output_s = None
+    job = client.submit(characteristics, fresh, fmt, api_name="/build_deck")
+    while not job.done():
+        now = time.perf_counter() - started
+        if queue_s is None and job.status().code in (Status.PROCESSING, Status.ITERATING):
+            queue_s = now
+        if first_output_s is None and job.outputs():
+            first_output_s = now
+        time.sleep(POLL_S)
+    latency_s = time.perf_counter() - started
+    try:
+        outputs, exc = job.result(), None
+    except Exception as err:
+        outputs, exc = None, err
+    return Sample(started, latency_s, queue_s, first_output_s or (latency_s if exc is None else None),
+                  classify(outputs, exc))
+
+
+def virtual_user(url: str, deadline: float, args, rng: random.Random, samples: list, lock: threading.Lock):
+    client = Client(url, verbose=False)
+    while time.perf_counter() < deadline:
+        if rng.random() < args.repeat_share:
+            characteristics = rng.choice(REPEATED_PROMPTS)
+        else:
+            # A unique request misses the response cache, like most real traffic.
+            characteristics = f"{rng.choice(REPEATED_PROMPTS)} (variant {uuid.uuid4().hex[:8]})"
+        sample = one_request(client, characteristics, args.fresh, args.format)
+        with lock:
+            samples.append(sample)
+        if args.think_time:
+            time.sleep(rng.expovariate(1 / args.think_time))
+
+
+def summarize(users: int, samples: list[Sample], elapsed_s: float) -> dict:
+    ok = [s for s in samples if s.outcome == "ok"]
+    latencies = [s.latency_s for s in ok]
+    queue = [s.queue_s for s in samples if s.queue_s is not None]
+    first = [s.first_output_s for s in ok if s.first_output_s is not None]
+    outcomes = {outcome: sum(s.outcome == outcome for s in samples) for outcome in ("ok", "rejected", "error")}
+    return {
+        "users": users,
+        "requests": len(samples),
+        "outcomes": outcomes,
+        "error_rate": (len(samples) - len(ok)) / len(samples) if samples else None,
+        "throughput_rps": len(ok) / elapsed_s if elapsed_s else None,
+        "latency_s": {"p50": percentile(latencies, 0.5), "p95": percentile(latencies, 0.95),
+                      "p99": percentile(latencies, 0.99)},
+        "queue_wait_s": {"p50": percentile(queue, 0.5), "p95": percentile(queue, 0.95),
+                         "p99": percentile(queue, 0.99)},
+        "first_output_s": {"p50": percentile(first, 0.5), "p95": percentile(first, 0.95)},
+    }
+
+
+def run_level(url: str, users: int, args) -> dict:
+    samples: list[Sample] = []
+    lock = threading.Lock()
+    started = time.perf_counter()
+    deadline = started + args.duration
+    threads = [
+        threading.Thread(target=virtual_user, args=(url, deadline, args, random.Random(args.seed + i), samples, lock),
+                         name=f"user-{i}", daemon=True)
+        for i in range(users)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Requests still running at the deadline are waited for, so the
+    # throughput window runs until the last one finishes.
+    return summarize(users, samples, time.perf_counter() - started)
+
+
+def saturation(levels: list[dict], gain: float = 0.1) -> int | None:
+    """The first user count where more users stop buying at least `gain` more throughput."""
+    for before, after in zip(levels, levels[1:]):
+        if before["throughput_rps"] and (after["throughput_rps"] or 0) < before["throughput_rps"] * (1 + gain):
+            return before["users"]
+    return None
+
+
+def print_level(level: dict) -> None:
+    def fmt(value):
+        return f"{value:7.2f}" if value is not None else "      -"
+
+    lat, queue = level["latency_s"], level["queue_wait_s"]
+    print(f"{level['users']:>5} {level['requests']:>6} {fmt(level['throughput_rps'])} "
+          f"{fmt(lat['p50'])} {fmt(lat['p95'])} {fmt(lat['p99'])} {fmt(queue['p50'])} {fmt(queue['p95'])} "
+          f"{level['outcomes']['rejected']:>5} {level['outcomes']['error']:>5}", flush=True)
+
+
+def wait_ready(url: str, timeout_s: float) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{url}/readyz", timeout=5) as resp:
+                if resp.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(1)
+    raise TimeoutError(f"{url} was not ready after {timeout_s:.0f}s")
+
+
+def spawn_app(args, scratch: str) -> tuple[fake_gemini.FakeGemini, subprocess.Popen]:
+    fake = fake_gemini.start(fake_gemini.model_from_args(args), port=args.fake_port, seed=args.seed)
+    env = dict(
+        os.environ,
+        GEMINI_BASE_URL=f"http://127.0.0.1:{fake.server_port}",
+        API_KEY="fake",
+        WARM_UP="1",
+        # Fake recipes and latencies stay out of the real response cache and tier policy.
+        RESPONSE_CACHE_PATH=os.path.join(scratch, "response_cache.db"),
+        POLICY_STATE_PATH=os.path.join(scratch, "policy_state.json"),
+    )
+    app = subprocess.Popen([sys.executable, "app.py"], env=env)
+    return fake, app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Drive app.py's build_deck endpoint with concurrent users and report latency and throughput."
+    )
+    parser.add_argument("--url", default="http://127.0.0.1:7860", help="running app to test")
+    parser.add_argument("--spawn", action="store_true",
+                        help="start app.py against a local fake Gemini API instead of using a running app")
+    parser.add_argument("--fake-port", type=int, default=0, help="port for the fake API (0 picks a free one)")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32],
+                        help="concurrent virtual users at each level")
+    parser.add_argument("--duration", type=float, default=300, help="seconds to run each level")
+    parser.add_argument("--think-time", type=float, default=0, help="mean pause between a user's requests")
+    parser.add_argument("--repeat-share", type=float, default=0.0,
+                        help="share of requests that repeat a common prompt")
+    parser.add_argument("--fresh", action="store_true", help="send every request with 'force a fresh deck'")
+    parser.add_argument("--format", default="modern")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="loadtest_results.json", help="JSON file to write results to")
+    fake_gemini.add_model_arguments(parser)
+    args = parser.parse_args(argv)
+
+    fake = app = None
+    scratch = tempfile.TemporaryDirectory(prefix="loadtest-")
+    if args.spawn:
+        fake, app = spawn_app(args, scratch.name)
+    try:
+        wait_ready(args.url, timeout_s=600)
+        print("users   reqs   req/s     p50     p95     p99  queue50 queue95  rej   err", flush=True)
+        levels = []
+        for users in args.users:
+            levels.append(run_level(args.url, users, args))
+            print_level(levels[-1])
+    finally:
+        if app is not None:
+            app.terminate()
+            app.wait()
+        if fake is not None:
+            fake.shutdown()
+        scratch.cleanup()
+
+    results = {
+        "args": vars(args),
+        "fake_model": fake_gemini.model_from_args(args)._asdict() if args.spawn else None,
+        "levels": levels,
+        "saturation_users": saturation(levels),
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    if results["saturation_users"] is None:
+        print(f"Throughput still rising at {args.users[-1]} users.")
+    else:
+        print(f"Throughput stops rising at about {results['saturation_users']} users.")
+    print(f"Results written to {args.out}.")
+
+
+if __name__ == "__main__":
+    main()
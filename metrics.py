@@ -0,0 +1,216 @@
+import contextvars
+import functools
+import inspect
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Stage latencies run from sub-millisecond DB work to multi-minute model calls.
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 30, 60, 120, 180, 300)
+
+
+def _label_text(labels: tuple[tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    body = ",".join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                    for k, v in labels)
+    return "{" + body + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_label_text(key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: tuple[float, ...] = SECONDS_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (per-bucket counts, sum, count)
+        self._values: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, total, n = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = [counts, total + value, n + 1]
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(tuple(sorted(labels.items())))
+        return entry[2] if entry else 0
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, n) in self._values.items():
+                running = 0
+                for bound, count in zip(self.buckets, counts):
+                    running += count
+                    lines.append(f"{self.name}_bucket{_label_text(key + (('le', f'{bound:g}'),))} {running}")
+                lines.append(f"{self.name}_bucket{_label_text(key + (('le', '+Inf'),))} {n}")
+                lines.append(f"{self.name}_sum{_label_text(key)} {total:g}")
+                lines.append(f"{self.name}_count{_label_text(key)} {n}")
+        return lines
+
+
+class Gauge:
+    """A value read from a callback when the metrics are scraped."""
+
+    def __init__(self, name: str, help_text: str, read):
+        self.name = name
+        self.help = help_text
+        self.read = read
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.read():g}"]
+
+
+class Registry:
+    """Holds the app's metrics and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram | Gauge] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name: str, make):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = make()
+            return self._metrics[name]
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._get(name, lambda: Counter(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets: tuple[float, ...] = SECONDS_BUCKETS) -> Histogram:
+        return self._get(name, lambda: Histogram(name, help_text, buckets))
+
+    def gauge(self, name: str, help_text: str, read) -> Gauge:
+        return self._get(name, lambda: Gauge(name, help_text, read))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram("tcg_stage_seconds", "Time spent in each stage of a deck request.")
+
+_trace_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("trace_id", default=None)
+_trace_file = None
+_trace_lock = threading.Lock()
+
+
+def configure_trace(path: str | None) -> None:
+    """Appends one JSON line per span to path; None turns the trace log off."""
+    global _trace_file
+    with _trace_lock:
+        if _trace_file is not None:
+            _trace_file.close()
+        _trace_file = open(path, "a", encoding="utf-8", buffering=1) if path else None
+
+
+def trace_event(event: str, **fields) -> None:
+    if _trace_file is None:
+        return
+    record = {"ts": time.time(), "trace": _trace_id.get(), "event": event, **fields}
+    line = json.dumps(record, default=str)
+    with _trace_lock:
+        if _trace_file is not None:
+            _trace_file.write(line + "\n")
+
+
+def observe_span(stage: str, elapsed: float, **attrs) -> None:
+    STAGE_SECONDS.observe(elapsed, stage=stage)
+    trace_event("span", stage=stage, duration_s=elapsed, **attrs)
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_span(stage, time.perf_counter() - started, **attrs)
+
+
+@contextmanager
+def trace(trace_id: str | None = None):
+    """Gives the spans inside one request a shared trace id in the JSONL log.
+
+    Nested calls keep the id already in effect.
+    """
+    token = _trace_id.set(trace_id or _trace_id.get() or uuid.uuid4().hex[:16])
+    try:
+        yield
+    finally:
+        _trace_id.reset(token)
+
+
+def timed(stage: str):
+    """Records every call of the decorated function as a span.
+
+    Coroutines and async generators also open a trace. Gradio may run each
+    step of an async generator in a different task, so the trace id is put
+    back in place around every step rather than set once.
+    """
+    def decorate(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def agen_wrapper(*args, **kwargs):
+                trace_id = _trace_id.get() or uuid.uuid4().hex[:16]
+                started = time.perf_counter()
+                gen = fn(*args, **kwargs)
+                try:
+                    while True:
+                        with trace(trace_id):
+                            try:
+                                item = await anext(gen)
+                            except StopAsyncIteration:
+                                break
+                        yield item
+                finally:
+                    with trace(trace_id):
+                        await gen.aclose()
+                        observe_span(stage, time.perf_counter() - started)
+            return agen_wrapper
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with trace(), span(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
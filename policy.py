@@ -0,0 +1,156 @@
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from typing import NamedTuple
+
+# Words that add a requirement the deck has to meet.
+CONSTRAINT_RE = re.compile(
+    r"\b(no|not|without|only|must|exactly|at least|at most|avoid|except|exclude|budget|include|under|over)\b",
+    re.IGNORECASE,
+)
+SEPARATOR_RE = re.compile(r"[,;+]|\band\b|\bwith\b|\bplus\b", re.IGNORECASE)
+NUMBER_RE = re.compile(r"\d+")
+# Capitalised words are mostly card or Pokémon names.
+NAME_RE = re.compile(r"\b[A-Z][a-zé]+\b")
+# Scores splitting requests into complexity buckets: 0 for a plain theme
+# ("mono fire deck"), 2 for one stacking several constraints and named cards.
+BUCKET_SCORES = (1.5, 3.5)
+
+
+class Tier(NamedTuple):
+    """
+    A model and thinking budget to generate with. latency_s and pass_rates
+    (one per complexity bucket) are the guesses used until the tier has been
+    measured on real requests.
+    """
+    name: str
+    model: str
+    thinking_budget: int
+    latency_s: float
+    pass_rates: tuple[float, ...]
+
+
+class Plan(NamedTuple):
+    bucket: int
+    # The tier to start on, then the ones to escalate to in order.
+    tiers: list[Tier]
+
+
+def complexity_score(text: str) -> float:
+    return (
+        min(len(text.split()), 120) / 40
+        + 0.5 * len(CONSTRAINT_RE.findall(text))
+        + 0.25 * len(SEPARATOR_RE.findall(text))
+        + 0.25 * len(NUMBER_RE.findall(text))
+        + 0.25 * len(set(NAME_RE.findall(text)))
+    )
+
+
+def complexity(text: str) -> int:
+    score = complexity_score(text)
+    return sum(score >= threshold for threshold in BUCKET_SCORES)
+
+
+class Policy:
+    """
+    Picks the tier each request starts on and escalates on a failed deck.
+
+    For every complexity bucket it keeps how long each tier takes and how
+    often its decks pass the deck rules, and starts on the tier with the
+    shortest expected time to a passing deck, counting the escalations a
+    failure would cost. Guesses from the tier list stand in until there
+    are measurements, and a small share of requests start one tier lower
+    than the best so cheaper tiers keep being measured.
+    """
+
+    def __init__(
+        self,
+        tiers: list[Tier],
+        state_path: str | None = None,
+        prior_weight: float = 4,
+        explore: float = 0.05,
+        save_interval_s: float = 30,
+        rng=random.random,
+        clock=time.monotonic,
+    ):
+        self.tiers = tiers
+        self.state_path = state_path
+        self.prior_weight = prior_weight
+        self.explore = explore
+        self.save_interval_s = save_interval_s
+        self.rng = rng
+        self.clock = clock
+        # "bucket/tier name" -> {"attempts", "passes", "calls", "latency_s"}
+        self.stats: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._saved_at = clock()
+        if state_path and os.path.exists(state_path):
+            try:
+                with open(state_path, encoding="utf-8") as f:
+                    self.stats = json.load(f)["stats"]
+            except (OSError, ValueError, KeyError) as exc:
+                sys.stderr.write(f"[WARN] Ignoring policy state in {state_path}: {exc}\n")
+
+    def _stat(self, bucket: int, tier: Tier) -> dict:
+        return self.stats.setdefault(f"{bucket}/{tier.name}", {"attempts": 0, "passes": 0, "calls": 0, "latency_s": 0.0})
+
+    def pass_rate(self, bucket: int, tier: Tier) -> float:
+        # The guess counts as prior_weight requests' worth of evidence.
+        prior = tier.pass_rates[bucket]
+        stat = self.stats.get(f"{bucket}/{tier.name}", {})
+        return (stat.get("passes", 0) + prior * self.prior_weight) / (stat.get("attempts", 0) + self.prior_weight)
+
+    def latency_s(self, bucket: int, tier: Tier) -> float:
+        stat = self.stats.get(f"{bucket}/{tier.name}", {})
+        return stat["latency_s"] if stat.get("calls") else tier.latency_s
+
+    def expected_s(self, bucket: int, start: int) -> float:
+        """Expected seconds to a deck when starting at tiers[start] and escalating on failure."""
+        expected = 0.0
+        for tier in reversed(self.tiers[start:]):
+            expected = self.latency_s(bucket, tier) + (1 - self.pass_rate(bucket, tier)) * expected
+        return expected
+
+    def plan(self, text: str) -> Plan:
+        bucket = complexity(text)
+        with self._lock:
+            start = min(range(len(self.tiers)), key=lambda i: self.expected_s(bucket, i))
+        if start and self.rng() < self.explore:
+            start -= 1
+        return Plan(bucket, self.tiers[start:])
+
+    def record_latency(self, bucket: int, tier: Tier, seconds: float) -> None:
+        with self._lock:
+            stat = self._stat(bucket, tier)
+            stat["calls"] += 1
+            # Exponentially weighted, so the estimate follows API slowdowns.
+            stat["latency_s"] = seconds if stat["calls"] == 1 else 0.8 * stat["latency_s"] + 0.2 * seconds
+
+    def record_outcome(self, bucket: int, tier: Tier, passed: bool) -> None:
+        with self._lock:
+            stat = self._stat(bucket, tier)
+            stat["attempts"] += 1
+            stat["passes"] += passed
+            # Called from the event loop, so the file is written at most every
+            # save_interval_s and off the calling thread.
+            now = self.clock()
+            if not self.state_path or now - self._saved_at < self.save_interval_s:
+                return
+            self._saved_at = now
+            state = json.dumps({"stats": self.stats})
+        threading.Thread(target=self._write, args=(state,), name="policy-save", daemon=True).start()
+
+    def _write(self, state: str) -> None:
+        tmp_path = f"{self.state_path}.tmp"
+        with self._write_lock:
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(state)
+                os.replace(tmp_path, self.state_path)
+            except OSError as exc:
+                sys.stderr.write(f"[WARN] Could not save policy state: {exc}\n")
@@ -0,0 +1,114 @@
+import sqlite3
+import time
+from collections import Counter
+from contextlib import closing
+from typing import NamedTuple
+
+from ext import display_set_code
+
+# Fuzzy matching gives up once a single name has used this much time and
+# returns the best candidate scored so far.
+FUZZY_BUDGET_S = 0.005
+# Only this many aliases sharing the most trigrams get an edit distance.
+FUZZY_CANDIDATES = 25
+
+
+class Match(NamedTuple):
+    set_name: str
+    number: str
+    name: str
+    fuzzy: bool
+
+
+def alias_candidates(raw_name: str, category: str) -> list[tuple[str, str]]:
+    words = raw_name.lower().split()
+    if category == "Pokemon":
+        # "name SET" / "name SET NUM", then the bare name if the set tag is off.
+        return [("pokemon", " ".join(words)), ("pokemon", " ".join(words[:-1]))]
+    # Trainer/Energy names may carry a trailing word or two the card list
+    # doesn't have, so also try with up to two words chopped off.
+    return [("trainer", " ".join(words[:len(words) - chop])) for chop in range(3)]
+
+
+def trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1]
+
+
+class CardResolver:
+    """Resolves deck entries against card_aliases held in memory."""
+
+    def __init__(self, rows: list[tuple[str, str, str, str, str, str]]):
+        self.exact: dict[tuple[str, str], tuple[str, str, str, str]] = {}
+        self.aliases: dict[str, list[str]] = {}
+        self.grams: dict[str, dict[str, list[int]]] = {}
+        for kind, alias, set_name, number, name, card_type in rows:
+            self.exact[(kind, alias)] = (set_name, number, name, card_type)
+            aliases = self.aliases.setdefault(kind, [])
+            postings = self.grams.setdefault(kind, {})
+            for gram in trigrams(alias):
+                postings.setdefault(gram, []).append(len(aliases))
+            aliases.append(alias)
+        self.fuzzy_hits = 0
+
+    @classmethod
+    def from_db(cls, db_path: str = "pokemon_cards.db") -> "CardResolver":
+        with closing(sqlite3.connect(db_path)) as conn:
+            rows = conn.execute(
+                """
+                SELECT a.kind, a.alias, a.set_name, a.number, c.name, c.card_type
+                FROM card_aliases a
+                JOIN cards c ON c.id = a.card_id
+                """
+            ).fetchall()
+        return cls(rows)
+
+    def _match(self, key: tuple[str, str], fuzzy: bool) -> Match:
+        set_name, number, name, card_type = self.exact[key]
+        if card_type == "pokemon":
+            name = f"{name} {display_set_code(set_name)}"
+        else:
+            name = key[1]
+        return Match(set_name, number, name, fuzzy)
+
+    def fuzzy(self, kind: str, text: str, budget_s: float = FUZZY_BUDGET_S) -> str | None:
+        postings = self.grams.get(kind, {})
+        shared = Counter()
+        for gram in trigrams(text):
+            shared.update(postings.get(gram, ()))
+        limit = max(1, len(text) // 6)
+        deadline = time.perf_counter() + budget_s
+        best, best_dist = None, limit + 1
+        for idx, _ in shared.most_common(FUZZY_CANDIDATES):
+            alias = self.aliases[kind][idx]
+            dist = edit_distance(text, alias, min(limit, best_dist - 1))
+            if dist < best_dist:
+                best, best_dist = alias, dist
+            if best_dist <= 1 or time.perf_counter() > deadline:
+                break
+        return best
+
+    def resolve(self, raw_name: str, category: str) -> Match | None:
+        candidates = alias_candidates(raw_name, category)
+        for key in candidates:
+            if key in self.exact:
+                return self._match(key, False)
+        kind, text = candidates[0]
+        if alias := self.fuzzy(kind, text):
+            self.fuzzy_hits += 1
+            return self._match((kind, alias), True)
+        return None
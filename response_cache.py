@@ -0,0 +1,155 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import REGISTRY
+
+lookups = REGISTRY.counter("tcg_response_cache_lookups_total", "Response cache lookups by result.")
+evictions = REGISTRY.counter("tcg_response_cache_evictions_total", "Recipes dropped from the response cache, by reason.")
+
+
+def normalize_characteristics(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def cache_key(characteristics: str, model: str, temperature: float, prompt_hash: str) -> str:
+    parts = [normalize_characteristics(characteristics), model, repr(temperature), prompt_hash]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """In-process LRU in front of a SQLite table of generated recipes."""
+
+    def __init__(
+        self,
+        path: str = "response_cache.db",
+        max_entries: int = 5000,
+        ttl_s: float = 7 * 24 * 3600,
+        lru_size: int = 256,
+        flush_every: int = 256,
+        flush_interval_s: float = 30,
+        clock=time.time,
+    ):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.lru_size = lru_size
+        self.flush_every = flush_every
+        self.flush_interval_s = flush_interval_s
+        self.clock = clock
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        self.evictions = 0
+        self._lru: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        # Key -> last read, written to the accessed column in batches rather
+        # than with a commit per hit.
+        self._accessed: dict[str, float] = {}
+        self._flushed_at = clock()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                created REAL,
+                accessed REAL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed)")
+        self._conn.commit()
+
+    def get(self, key: str) -> str | None:
+        now = self.clock()
+        with self._lock:
+            if key in self._lru:
+                value, created = self._lru[key]
+                if now - created < self.ttl_s:
+                    self._lru.move_to_end(key)
+                    # Keep the disk LRU order right for entries only ever read from memory.
+                    self._touch(key, now)
+                    self.hits["memory"] += 1
+                    lookups.inc(result="memory_hit")
+                    return value
+                del self._lru[key]
+            row = self._conn.execute(
+                "SELECT value, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] >= self.ttl_s:
+                self.misses += 1
+                lookups.inc(result="miss")
+                return None
+            self._touch(key, now)
+            self._remember(key, row[0], row[1])
+            self.hits["disk"] += 1
+            lookups.inc(result="disk_hit")
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        now = self.clock()
+        with self._lock:
+            self._remember(key, value, now)
+            self._accessed.pop(key, None)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, value, now, now)
+            )
+            # Eviction goes by the accessed column, so bring it up to date first.
+            self._write_accessed(now)
+            self._evict(now)
+            self._conn.commit()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._accessed:
+                self._write_accessed(self.clock())
+                self._conn.commit()
+
+    def _touch(self, key: str, now: float) -> None:
+        self._accessed[key] = now
+        if len(self._accessed) >= self.flush_every or now - self._flushed_at >= self.flush_interval_s:
+            self._write_accessed(now)
+            self._conn.commit()
+
+    def _write_accessed(self, now: float) -> None:
+        self._conn.executemany(
+            "UPDATE responses SET accessed = ? WHERE key = ?",
+            [(accessed, key) for key, accessed in self._accessed.items()],
+        )
+        self._accessed.clear()
+        self._flushed_at = now
+
+    def _remember(self, key: str, value: str, created: float) -> None:
+        self._lru[key] = (value, created)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def _evict(self, now: float) -> None:
+        expired = self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_s,)).rowcount
+        over = self._conn.execute(
+            """
+            DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        ).rowcount
+        self.evictions += expired + over
+        evictions.inc(expired, reason="expired")
+        evictions.inc(over, reason="capacity")
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {
+                "memory_hits": self.hits["memory"],
+                "disk_hits": self.hits["disk"],
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "memory_entries": len(self._lru),
+                "disk_entries": size,
+            }
@@ -0,0 +1,124 @@
+import re
+import sqlite3
+
+from db_pool import read_only
+from short import CHARS_PER_TOKEN, SUFFIX
+
+# Below this many matched Pokémon the request is too vague to narrow the
+# pool, and the caller should send the full card list instead.
+MIN_POKEMON_HITS = 5
+MAX_HITS = 400
+# Pre-evolutions and evolutions followed from each matched Pokémon.
+EVOLUTION_DEPTH = 2
+
+STAPLE_TRAINERS = [
+    "professor's research", "boss's orders", "iono", "arven", "judge",
+    "professor sada's vitality", "professor turo's scenario", "irida",
+    "ultra ball", "nest ball", "quick ball", "level ball", "buddy-buddy poffin",
+    "rare candy", "evolution incense", "earthen vessel", "energy retrieval",
+    "super rod", "night stretcher", "switch", "escape rope", "counter catcher",
+    "prime catcher", "lost vacuum", "pal pad", "battle vip pass",
+]
+
+STOPWORDS = {
+    "a", "an", "and", "around", "as", "at", "be", "build", "card", "cards",
+    "deck", "decks", "for", "from", "i", "in", "into", "is", "it", "like",
+    "make", "me", "my", "of", "on", "or", "please", "pokemon", "pokémon",
+    "some", "that", "the", "this", "to", "use", "using", "want", "with",
+}
+
+# bm25() weights for name, effect, abilities, attacks, types.
+SEARCH_SQL = """
+    SELECT p.id, p.line, p.name, p.card_type
+    FROM prompt_cards_fts f
+    JOIN prompt_cards p ON p.id = f.rowid
+    WHERE prompt_cards_fts MATCH ?
+    ORDER BY bm25(prompt_cards_fts, 10.0, 1.0, 1.0, 1.0, 4.0)
+    LIMIT ?
+"""
+
+STAPLES_SQL = """
+    SELECT id, line, name, card_type
+    FROM prompt_cards
+    WHERE name IN ({marks}) OR is_basic_energy = 1
+"""
+
+PRE_EVOLUTIONS_SQL = """
+    SELECT id, line, name, card_type
+    FROM prompt_cards
+    WHERE name IN (SELECT evolve_from FROM prompt_cards WHERE name IN ({marks}))
+"""
+
+EVOLUTIONS_SQL = """
+    SELECT id, line, name, card_type
+    FROM prompt_cards
+    WHERE evolve_from IN ({marks})
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def match_query(characteristics: str) -> str:
+    words = re.findall(r"[\w'-]+", characteristics.lower())
+    terms = dict.fromkeys(w.replace('"', "") for w in words if w not in STOPWORDS)
+    return " OR ".join(f'"{term}"' for term in terms if term)
+
+
+def evolution_line(conn: sqlite3.Connection, name: str) -> list[tuple]:
+    rows: list[tuple] = []
+    for sql in (PRE_EVOLUTIONS_SQL, EVOLUTIONS_SQL):
+        frontier = [name]
+        for _ in range(EVOLUTION_DEPTH):
+            step = conn.execute(sql.format(marks=",".join("?" * len(frontier))), frontier).fetchall()
+            rows += step
+            frontier = list({r[2] for r in step})
+            if not frontier:
+                break
+    return rows
+
+
+def build_system_prompt(
+    characteristics: str,
+    db_path: str = "pokemon_cards.db",
+    token_budget: int = 30000,
+) -> str | None:
+    query = match_query(characteristics)
+    if not query:
+        return None
+
+    conn = read_only(db_path).connection()
+    hits = conn.execute(SEARCH_SQL, (query, MAX_HITS)).fetchall()
+    if sum(card_type == "pokemon" for *_, card_type in hits) < MIN_POKEMON_HITS:
+        return None
+    staples = conn.execute(
+        STAPLES_SQL.format(marks=",".join("?" * len(STAPLE_TRAINERS))),
+        STAPLE_TRAINERS,
+    ).fetchall()
+
+    budget = token_budget - estimate_tokens(SUFFIX)
+    chosen: dict[int, str] = {}
+
+    def take(card_id: int, line: str) -> bool:
+        nonlocal budget
+        if card_id in chosen:
+            return True
+        cost = estimate_tokens(line)
+        if cost > budget:
+            return False
+        chosen[card_id] = line
+        budget -= cost
+        return True
+
+    for card_id, line, _, _ in staples:
+        take(card_id, line)
+    for card_id, line, name, card_type in hits:
+        if not take(card_id, line):
+            break
+        if card_type == "pokemon":
+            for evo_id, evo_line, _, _ in evolution_line(conn, name):
+                take(evo_id, evo_line)
+
+    body = "\n".join(chosen.values())
+    return f"Card List:\n{body}\n{SUFFIX}"
@@ -0,0 +1,233 @@
+import heapq
+import sqlite3
+from collections import Counter, defaultdict
+from typing import NamedTuple
+
+from cardstore import CardStore
+from ext import PARENS_RE
+from metrics import timed
+
+DECK_SIZE = 60
+MAX_COPIES = 4
+# Energy types that have a basic Energy card; Colorless and Dragon don't.
+BASIC_ENERGY_TYPES = ("grass", "fire", "water", "lightning", "psychic", "fighting", "darkness", "metal")
+# Copies of basic Energy added to a deck that has none before rebalancing.
+BASIC_ENERGY_FILL = 8
+
+
+class CardFlags(NamedTuple):
+    name: str
+    types: str
+    ace_spec: bool
+    radiant: bool
+    rule_box: bool
+    basic_energy: bool
+
+
+def display_number(number) -> str:
+    return str(number).replace("swsh", "").replace("sm", "")
+
+
+def deck_total(groups: dict) -> int:
+    return sum(row[0] for rows in groups.values() for row in rows)
+
+
+@timed("balance_trainers_to_sixty")
+def balance_trainers_to_sixty(groups: dict, headroom: Counter | None = None, identity=None) -> None:
+    # headroom, keyed by identity(row), limits the copies that may be added to
+    # a card on top of what the deck already holds across all its prints.
+    total = deck_total(groups)
+    trainers = groups.get("Trainer", [])
+
+    if total > DECK_SIZE:
+        # Take from the largest count first, the last entry among ties.
+        heap = [(-row[0], -idx) for idx, row in enumerate(trainers)]
+        heapq.heapify(heap)
+        while total > DECK_SIZE and heap:
+            neg_cnt, neg_idx = heapq.heappop(heap)
+            cnt, *rest = trainers[-neg_idx]
+            trainers[-neg_idx] = (cnt - 1, *rest)
+            total -= 1
+            if cnt > 1:
+                heapq.heappush(heap, (neg_cnt + 1, neg_idx))
+        trainers[:] = [row for row in trainers if row[0] > 0]
+
+    elif total < DECK_SIZE:
+        # Add to the smallest count first, the first entry among ties.
+        heap = [(row[0], idx) for idx, row in enumerate(trainers) if row[0] < MAX_COPIES]
+        heapq.heapify(heap)
+        while total < DECK_SIZE and heap:
+            cnt, idx = heapq.heappop(heap)
+            if headroom is not None:
+                name = identity(trainers[idx])
+                if headroom[name] <= 0:
+                    continue
+                headroom[name] -= 1
+            trainers[idx] = (cnt + 1, *trainers[idx][1:])
+            total += 1
+            if cnt + 1 < MAX_COPIES:
+                heapq.heappush(heap, (cnt + 1, idx))
+
+
+class DeckRules:
+    """Validates and repairs compile_deck groups using the per-card flags in the DB."""
+
+    def __init__(self, rows: list[tuple]):
+        self.flags: dict[tuple[str, str], CardFlags] = {}
+        self.basic_energy: dict[str, tuple[str, str, str]] = {}
+        for name, set_name, number, types, ace_spec, radiant, rule_box, basic_energy in rows:
+            flags = CardFlags(name, types or "", bool(ace_spec), bool(radiant), bool(rule_box), bool(basic_energy))
+            self.flags.setdefault((set_name, display_number(number)), flags)
+            if basic_energy:
+                for energy_type in BASIC_ENERGY_TYPES:
+                    if energy_type in name.split():
+                        self.basic_energy.setdefault(energy_type, (name, set_name, display_number(number)))
+
+    @classmethod
+    def from_db(cls, db_path: str = "pokemon_cards.db") -> "DeckRules":
+        with sqlite3.connect(db_path) as conn:
+            # Newest regulation first, so the first print seen is the one to add.
+            rows = conn.execute(
+                """
+                SELECT name, set_name, number, types,
+                       is_ace_spec, is_radiant, is_rule_box, is_basic_energy
+                FROM cards
+                ORDER BY regulation DESC, set_name, CAST(number AS INTEGER)
+                """
+            ).fetchall()
+        return cls(rows)
+
+    @classmethod
+    def from_store(cls, store: CardStore) -> "DeckRules":
+        # The store keeps rows in the same order from_db asks for.
+        columns = ("name", "set_name", "number", "types",
+                   "is_ace_spec", "is_radiant", "is_rule_box", "is_basic_energy")
+        return cls([tuple(card[col] for col in columns) for card in store])
+
+    def lookup(self, row: tuple) -> CardFlags | None:
+        _, _, set_name, number = row
+        if not set_name:
+            return None
+        return self.flags.get((set_name.lower(), number))
+
+    def identity(self, row: tuple) -> str:
+        # Copies are counted by card name across every print of it.
+        flags = self.lookup(row)
+        name = flags.name if flags is not None else row[1].lower()
+        return " ".join(PARENS_RE.sub("", name).split())
+
+    def _rows(self, groups: dict):
+        for cat in ("Pokemon", "Trainer", "Energy"):
+            for idx, row in enumerate(groups.get(cat, [])):
+                yield cat, idx, row, self.lookup(row)
+
+    def validate(self, groups: dict) -> list[str]:
+        problems = []
+        copies: Counter[str] = Counter()
+        ace_specs = radiants = basic_energy = 0
+        for _, _, row, flags in self._rows(groups):
+            if flags is not None and flags.basic_energy:
+                basic_energy += row[0]
+                continue
+            copies[self.identity(row)] += row[0]
+            if flags is not None:
+                ace_specs += row[0] if flags.ace_spec else 0
+                radiants += row[0] if flags.radiant else 0
+        for name, count in copies.items():
+            if count > MAX_COPIES:
+                problems.append(f"{count} copies of {name}, at most {MAX_COPIES} allowed")
+        if ace_specs > 1:
+            problems.append(f"{ace_specs} ACE SPEC cards, at most 1 allowed")
+        if radiants > 1:
+            problems.append(f"{radiants} Radiant Pokémon, at most 1 allowed")
+        if not basic_energy:
+            problems.append("no basic Energy")
+        if (total := deck_total(groups)) != DECK_SIZE:
+            problems.append(f"{total} cards instead of {DECK_SIZE}")
+        return problems
+
+    def _set_count(self, groups: dict, cat: str, idx: int, count: int) -> None:
+        rows = groups[cat]
+        rows[idx] = (count, *rows[idx][1:])
+
+    def _cap_copies(self, groups: dict) -> list[str]:
+        fixes = []
+        by_name: dict[str, list[tuple[str, int]]] = defaultdict(list)
+        for cat, idx, row, flags in self._rows(groups):
+            if flags is None or not flags.basic_energy:
+                by_name[self.identity(row)].append((cat, idx))
+        for name, places in by_name.items():
+            excess = sum(groups[cat][idx][0] for cat, idx in places) - MAX_COPIES
+            if excess <= 0:
+                continue
+            fixes.append(f"cut {name} to {MAX_COPIES} copies")
+            # The last prints listed give way first.
+            for cat, idx in reversed(places):
+                cut = min(excess, groups[cat][idx][0])
+                self._set_count(groups, cat, idx, groups[cat][idx][0] - cut)
+                excess -= cut
+                if not excess:
+                    break
+        return fixes
+
+    def _cap_one(self, groups: dict, flag: str, label: str) -> list[str]:
+        kept = False
+        cut = 0
+        for cat, idx, row, flags in self._rows(groups):
+            if flags is None or not getattr(flags, flag) or not row[0]:
+                continue
+            keep = 0 if kept else 1
+            cut += row[0] - keep
+            self._set_count(groups, cat, idx, keep)
+            kept = True
+        return [f"kept a single {label} card, cut {cut}"] if cut else []
+
+    def _headroom(self, groups: dict) -> Counter:
+        copies: Counter[str] = Counter()
+        single = set()
+        for _, _, row, flags in self._rows(groups):
+            if flags is not None and flags.basic_energy:
+                continue
+            copies[self.identity(row)] += row[0]
+            if flags is not None and (flags.ace_spec or flags.radiant):
+                single.add(self.identity(row))
+        # The one ACE SPEC or Radiant card left by _cap_one can't be padded.
+        return Counter({name: 0 if name in single else MAX_COPIES - count for name, count in copies.items()})
+
+    def _energy_type(self, groups: dict) -> str | None:
+        # Rule-box Pokémon are usually the attackers, so their types count double.
+        weights: Counter[str] = Counter()
+        for _, _, row, flags in self._rows(groups):
+            if flags is None or not flags.types:
+                continue
+            for energy_type in flags.types.split(","):
+                if energy_type in self.basic_energy:
+                    weights[energy_type] += row[0] * (2 if flags.rule_box else 1)
+        return weights.most_common(1)[0][0] if weights else None
+
+    def _basic_energy_rows(self, groups: dict) -> list[int]:
+        return [
+            idx for cat, idx, _, flags in self._rows(groups)
+            if cat == "Energy" and flags is not None and flags.basic_energy
+        ]
+
+    def repair(self, groups: dict) -> list[str]:
+        fixes = self._cap_copies(groups)
+        fixes += self._cap_one(groups, "ace_spec", "ACE SPEC")
+        fixes += self._cap_one(groups, "radiant", "Radiant")
+        for cat in groups:
+            groups[cat][:] = [row for row in groups[cat] if row[0] > 0]
+
+        if not self._basic_energy_rows(groups) and (energy_type := self._energy_type(groups)):
+            name, set_name, number = self.basic_energy[energy_type]
+            groups.setdefault("Energy", []).append((BASIC_ENERGY_FILL, name.title(), set_name, number))
+            fixes.append(f"added {BASIC_ENERGY_FILL} {name.title()}")
+
+        balance_trainers_to_sixty(groups, self._headroom(groups), self.identity)
+
+        # Trainers are maxed out; basic Energy has no copy limit.
+        if (missing := DECK_SIZE - deck_total(groups)) > 0 and (energy_rows := self._basic_energy_rows(groups)):
+            idx = max(energy_rows, key=lambda i: groups["Energy"][i][0])
+            self._set_count(groups, "Energy", idx, groups["Energy"][idx][0] + missing)
+            fixes.append(f"added {missing} {groups['Energy'][idx][1]} to reach {DECK_SIZE} cards")
+        return fixes
@@ -1,7 +1,12 @@
 import sqlite3
 import re
 import random
-from typing import List, Dict, Tuple
+import argparse
+from collections import Counter
+from typing import List, Dict, Tuple, Iterable, Iterator, NamedTuple, Optional
+
+from cardstore import CardStore
+from ext import PARENS_RE, display_set_code
 
 # Constants
 # SUFFIX for the output file
@@ -62,6 +67,38 @@ Role:
 You are a Pokemon TCG Deck Build Expert, users will give characteristics of a deck and you will build a deck with the cards based only on the card list provided, do not use cards outside of the list provided. Do not create decks blindly, all decks created must have synergy and a strategy.
 '''
 
+# Prepended to SUFFIX when the card list is written in compact mode
+COMPACT_NOTES = '''===
+Compact Encoding:
+$N stands for the phrase defined as $N=... in the Legend
+Energy symbols: G=grass R=fire W=water L=lightning P=psychic F=fighting D=darkness M=metal N=dragon Y=fairy C=colorless
+Types and attack costs are written with energy symbols, e.g. C:LCC is one lightning and two colorless
+'''
+
+ENERGY_SYMBOLS = {
+    "grass": "G", "fire": "R", "water": "W", "lightning": "L", "psychic": "P",
+    "fighting": "F", "darkness": "D", "metal": "M", "dragon": "N", "fairy": "Y",
+    "colorless": "C",
+}
+
+# Legend entries must be at least this long and repeat at least this often
+MIN_PHRASE_LEN = 24
+MIN_PHRASE_REPEATS = 3
+# Rough characters per model token, for size reports
+CHARS_PER_TOKEN = 4
+
+PHRASE_SPLIT_RE = re.compile(r'\.|\||\{|\}|;|:[ECD]:')
+FIELD_PREFIX_RE = re.compile(r'^[A-Z]+:')
+TYPES_FIELD_RE = re.compile(r'\bT:([a-z,]+)')
+COST_FIELD_RE = re.compile(r':C:([a-z,]+)')
+RETREAT_FIELD_RE = re.compile(r'\|R:\d+')
+SPACE_RUN_RE = re.compile(r'\s{2,}')
+
+# Buffer size for the streamed system.txt writer
+WRITE_BUFFER_BYTES = 1 << 20
+# Prompt index rows inserted per executemany in pipeline mode
+PROMPT_INDEX_BATCH = 1000
+
 # Order of rarities for sorting
 RARITIES_ORDER = [
     "common", "uncommon", "rare", "rare holo", "promo", "rare ultra", 
@@ -75,12 +112,102 @@ RARITIES_ORDER = [
     "amazing rare"
 ]
 
-def fetch_cards_from_db(db_path: str = "pokemon_cards.db") -> List[sqlite3.Row]:
+# Regulation marks currently legal in Standard
+STANDARD_REGULATIONS = ('g', 'h', 'i')
+
+class CardPool(NamedTuple):
+    """
+    The cards a prompt format draws from. A card is in the pool when its set id
+    starts with one of series and its regulation mark is one of regulations
+    (an empty tuple allows any), or when it is basic Energy and basic_energy is set.
+    """
+    series: Tuple[str, ...] = ()
+    regulations: Tuple[str, ...] = ()
+    basic_energy: bool = False
+
+# Card pool of each prompt format
+FORMATS = {
+    # Basic Energy is printed without a regulation mark and is always legal.
+    "modern": CardPool(series=('sv', 'swsh'),
+                       regulations=('e', 'f', 'g', 'h', 'i', 'j', 'k', 'l'), basic_energy=True),
+    "standard": CardPool(regulations=STANDARD_REGULATIONS, basic_energy=True),
+    "expanded": CardPool(series=('sv', 'swsh', 'sm', 'xy', 'bw')),
+}
+DEFAULT_FORMAT = "modern"
+# The default format keeps the system.txt name the app has always read
+FORMAT_PROMPTS = {
+    fmt: "system.txt" if fmt == DEFAULT_FORMAT else f"system_{fmt}.txt"
+    for fmt in FORMATS
+}
+
+def pool_where(pool: CardPool) -> str:
+    """Builds the SQL condition selecting a card pool from the cards table."""
+    parts = []
+    if pool.series:
+        parts.append("(" + " OR ".join(f"series LIKE '{prefix}%'" for prefix in pool.series) + ")")
+    if pool.regulations:
+        parts.append(f"regulation IN ({', '.join(repr(mark) for mark in pool.regulations)})")
+    where = " AND ".join(parts) or "1"
+    if pool.basic_energy:
+        where = f"({where}) OR is_basic_energy = 1"
+    return where
+
+def pool_matches(pool: CardPool, card) -> bool:
+    """Checks a card against a pool, the same way pool_where does in SQL."""
+    if pool.basic_energy and card['is_basic_energy']:
+        return True
+    if pool.series and not card['series'].startswith(pool.series):
+        return False
+    return not pool.regulations or card['regulation'] in pool.regulations
+
+def sql_int(text: str) -> int:
+    """Mirrors SQLite's CAST(text AS INTEGER): the leading digits, or 0."""
+    digits = re.match(r'\d*', text.strip()).group(0)
+    return int(digits) if digits else 0
+
+# group_and_filter_cards in SQL: one row per group, latest regulation first,
+# then best rarity, then the first print in set and number order. The window
+# sorts only carry ids and keys; the wide text columns are joined back on
+# the picked rows.
+PIPELINE_SQL = """
+    WITH ranked AS (
+        SELECT c.id, c.name, c.set_name, c.card_type,
+               ROW_NUMBER() OVER (
+                   PARTITION BY
+                       CASE WHEN c.card_type = 'pokemon' THEN c.name ELSE strip_parens(c.name) END,
+                       CASE WHEN c.card_type = 'pokemon' THEN COALESCE(c.attacks, '') END
+                   ORDER BY
+                       COALESCE(c.regulation, '') DESC,
+                       COALESCE(r.pos, :unranked),
+                       c.set_name,
+                       CAST(c.number AS INTEGER),
+                       c.number
+               ) AS pick
+        FROM cards c
+        LEFT JOIN temp.rarity_rank r ON r.rarity = lower(c.rarity)
+        WHERE ({filter})
+    ),
+    picked AS (
+        SELECT id, COUNT(*) OVER (PARTITION BY card_type, name, set_name) AS name_set_count,
+               random() AS shuffle
+        FROM ranked
+        WHERE pick = 1
+    )
+    SELECT c.name, c.set_name, c.types, c.number, c.hp, c.effect, c.abilities, c.attacks,
+           c.retreat, c.evolve_from, c.rarity, c.card_type, c.regulation, c.is_basic_energy,
+           p.name_set_count
+    FROM picked p
+    JOIN cards c ON c.id = p.id
+    ORDER BY p.shuffle
+"""
+
+def fetch_cards_from_db(db_path: str = "pokemon_cards.db", fmt: str = DEFAULT_FORMAT) -> List[sqlite3.Row]:
     """
     Fetches Pokemon card data from the SQLite database.
     
     Args:
         db_path: The path to the SQLite database file.
+        fmt: The format whose card pool to fetch, a key of FORMATS.
         
     Returns:
         A list of rows, where each row is a dictionary-like object representing a card.
@@ -88,15 +215,69 @@ def fetch_cards_from_db(db_path: str = "pokemon_cards.db") -> List[sqlite3.Row]:
     with sqlite3.connect(db_path) as conn:
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT name, set_name, types, number, hp, effect, abilities, attacks, retreat, evolve_from, rarity, card_type, regulation
+        cursor.execute(f"""
+            SELECT name, set_name, types, number, hp, effect, abilities, attacks, retreat, evolve_from, rarity, card_type, regulation,
+                   is_basic_energy
             FROM cards
-            WHERE series LIKE 'sv%' OR series LIKE 'swsh%' OR series LIKE 'sm%'
-                       AND regulation in ('e', 'f', 'g', 'h', 'i', 'j', 'k', 'l')
+            WHERE {pool_where(FORMATS[fmt])}
             ORDER BY set_name, CAST(number AS INTEGER)
         """)
         return cursor.fetchall()
 
+def fetch_cards_from_store(store_path: str = "pokemon_cards.bin", fmt: str = DEFAULT_FORMAT) -> list:
+    """
+    Fetches the same cards as fetch_cards_from_db from the mmapped card store
+    written by ext.py, as lazy Card views instead of sqlite3.Row objects.
+    
+    Args:
+        store_path: The path to the card store file.
+        fmt: The format whose card pool to fetch, a key of FORMATS.
+        
+    Returns:
+        A list of Card views in set and number order.
+    """
+    pool = FORMATS[fmt]
+    cards = [card for card in CardStore.open(store_path) if pool_matches(pool, card)]
+    cards.sort(key=lambda c: (c['set_name'], sql_int(c['number'])))
+    return cards
+
+def strip_parens(name: str) -> str:
+    """Drops parenthesised qualifiers such as "(Professor Turo)" from a name."""
+    return PARENS_RE.sub('', name).strip()
+
+def prepare_pipeline(conn: sqlite3.Connection):
+    """
+    Registers what PIPELINE_SQL needs on a connection: the strip_parens
+    function and a temporary rarity_rank table built from RARITIES_ORDER.
+    
+    Args:
+        conn: An open connection to the card database.
+    """
+    conn.create_function("strip_parens", 1, strip_parens, deterministic=True)
+    conn.execute("DROP TABLE IF EXISTS temp.rarity_rank")
+    conn.execute("CREATE TEMP TABLE rarity_rank (rarity TEXT PRIMARY KEY, pos INTEGER)")
+    # The first position wins, as with RARITIES_ORDER.index.
+    conn.executemany("INSERT OR IGNORE INTO temp.rarity_rank VALUES (?, ?)",
+                     [(rarity, pos) for pos, rarity in enumerate(RARITIES_ORDER)])
+
+def stream_cards(conn: sqlite3.Connection, fmt: str = DEFAULT_FORMAT) -> Iterator[Dict[str, object]]:
+    """
+    Yields the deduplicated cards in random order straight from the cursor,
+    each with a name_set_count column in place of count_name_sets.
+    
+    Args:
+        conn: A connection prepared with prepare_pipeline.
+        fmt: The format whose card pool to stream, a key of FORMATS.
+        
+    Yields:
+        One dict per card that goes into the prompt. Formatting reads a dozen
+        columns per card by name, which is cheaper on a dict than a sqlite3.Row.
+    """
+    cursor = conn.execute(PIPELINE_SQL.format(filter=pool_where(FORMATS[fmt])), {"unranked": len(RARITIES_ORDER)})
+    columns = [d[0] for d in cursor.description]
+    for row in cursor:
+        yield dict(zip(columns, row))
+
 def get_rarity_index(rarity: str) -> int:
     """
     Gets the index of a rarity string from the RARITIES_ORDER list.
@@ -132,7 +313,7 @@ def group_and_filter_cards(cards: List[sqlite3.Row]) -> List[sqlite3.Row]:
         card_type = (card['card_type'] or '').lower()
         name = card['name']
         if card_type != 'pokemon':
-            name = re.sub(r'\(.*?\)', '', name).strip()
+            name = strip_parens(name)
 
         key = (name, card['attacks'] or '') if card_type == 'pokemon' else name
         
@@ -151,13 +332,14 @@ def group_and_filter_cards(cards: List[sqlite3.Row]) -> List[sqlite3.Row]:
                 
     return list(grouped_cards.values())
 
-def format_card_string(card: sqlite3.Row, name_set_counts: Dict[Tuple[str, str], int]) -> str:
+def format_card_string(card: sqlite3.Row, name_set_counts: Optional[Dict[Tuple[str, str], int]] = None) -> str:
     """
     Formats a single card into the required string format.
     
     Args:
         card: The card data.
-        name_set_counts: A dictionary counting Pokémon with the same name in the same set.
+        name_set_counts: A dictionary counting Pokémon with the same name in the same set,
+            or None when the row carries its own name_set_count.
         
     Returns:
         A formatted string representing the card.
@@ -168,14 +350,17 @@ def format_card_string(card: sqlite3.Row, name_set_counts: Dict[Tuple[str, str],
     full_string = f"{card_name}|{attributes}"
     return clean_card_string(full_string)
 
-def format_card_name(card: sqlite3.Row, name_set_counts: Dict[Tuple[str, str], int]) -> str:
+def format_card_name(card: sqlite3.Row, name_set_counts: Optional[Dict[Tuple[str, str], int]] = None) -> str:
     """Formats the name part of the card string."""
     if card['card_type'] == 'pokemon':
-        set_name_upper = card['set_name'].upper().replace('PROMO_SWSH', 'SP').replace('PR-SW', 'SP').replace('PR-SM', 'SMP').replace('PR-SV', 'SVP')
-        base_name = f"{card['name']} {set_name_upper}"
+        base_name = f"{card['name']} {display_set_code(card['set_name'])}"
         
+        if name_set_counts is None:
+            same_name_in_set = card['name_set_count']
+        else:
+            same_name_in_set = name_set_counts.get((card['name'], card['set_name']), 0)
         # Add card number if there are multiple versions in the same set
-        if name_set_counts.get((card['name'], card['set_name']), 0) > 1:
+        if same_name_in_set > 1:
             number_str = ''.join(filter(str.isdigit, card['number']))
             base_name += f" {number_str.lstrip('0')}"
         return base_name
@@ -209,43 +394,327 @@ def format_card_attributes(card: sqlite3.Row) -> str:
 def clean_card_string(card_str: str) -> str:
     """Cleans up the formatted card string."""
     s = card_str.replace('.|', '|')
-    s = re.sub(r'\(.*?\)', '', s)
-    s = re.sub(r'\s{2,}', '.', s)
+    if '(' in s:
+        s = PARENS_RE.sub('', s)
+    s = SPACE_RUN_RE.sub('.', s)
     s = s.replace(' .', '.').replace(' ,', ',')
     parts = [part.strip() for part in s.split('|')]
     return "|".join(filter(None, parts))
 
-def write_cards_to_file(cards: List[sqlite3.Row], out_path: str = "system.txt"):
+def count_name_sets(cards: List[sqlite3.Row]) -> Dict[Tuple[str, str], int]:
     """
-    Writes the final formatted list of cards to a text file.
+    Counts Pokémon with the same name in the same set to decide if a card number is needed.
     
     Args:
-        cards: The list of cards to write.
-        out_path: The path to the output file.
+        cards: The list of cards that will be written.
+        
+    Returns:
+        A dictionary mapping (name, set_name) to the number of Pokémon sharing it.
     """
-    # Count Pokémon with the same name in the same set to decide if card number is needed
     name_set_counts = {}
     for card in cards:
         if (card['card_type'] or '').lower() == 'pokemon':
             key = (card['name'], card['set_name'])
             name_set_counts[key] = name_set_counts.get(key, 0) + 1
+    return name_set_counts
+
+def abbreviate_energies(text: str) -> str:
+    """Rewrites a comma-separated energy list as a string of energy symbols."""
+    return ''.join(ENERGY_SYMBOLS.get(t, t) for t in text.split(','))
+
+def split_phrases(line: str) -> List[str]:
+    """Splits a formatted card string into the text fragments eligible for the legend."""
+    fragments = PHRASE_SPLIT_RE.split(line)
+    return [FIELD_PREFIX_RE.sub('', f).strip() for f in fragments]
+
+def build_legend(lines: Iterable[str]) -> Dict[str, str]:
+    """
+    Picks the repeated phrases worth defining once in the legend.
+    
+    Args:
+        lines: The formatted card strings; read once, so a generator works.
+        
+    Returns:
+        A dictionary mapping each phrase to its code, best saving first.
+    """
+    counts = Counter(
+        phrase
+        for line in lines
+        for phrase in set(split_phrases(line))
+        if len(phrase) >= MIN_PHRASE_LEN
+    )
+    # Charge each phrase for its own legend line, with a two-character code.
+    savings = {phrase: n * (len(phrase) - 2) - (len(phrase) + 4)
+               for phrase, n in counts.items() if n >= MIN_PHRASE_REPEATS}
+    ranked = sorted((p for p in savings if savings[p] > 0), key=savings.get, reverse=True)
+    return {phrase: f"${i}" for i, phrase in enumerate(ranked, 1)}
+
+def compact_card_string(card: sqlite3.Row, line: str) -> str:
+    """Abbreviates energies and drops fields that carry no information for the card type."""
+    line = TYPES_FIELD_RE.sub(lambda m: 'T:' + abbreviate_energies(m.group(1)), line)
+    line = COST_FIELD_RE.sub(lambda m: ':C:' + abbreviate_energies(m.group(1)), line)
+    if card['card_type'] != 'pokemon':
+        # Only Pokémon retreat; trainers and energies always read R:0.
+        line = RETREAT_FIELD_RE.sub('', line)
+    return line
+
+def encode_compact(cards: List[sqlite3.Row], lines: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    Encodes formatted card strings in the compact prompt format.
+    
+    Args:
+        cards: The cards, in the same order as lines.
+        lines: The verbose formatted card strings.
+        
+    Returns:
+        The legend lines and the compact card strings.
+    """
+    lines = [compact_card_string(card, line) for card, line in zip(cards, lines)]
+    legend = build_legend(lines)
+    encode = legend_encoder(legend)
+    return [f"{code}={phrase}" for phrase, code in legend.items()], [encode(line) for line in lines]
+
+def legend_encoder(legend: Dict[str, str]):
+    """Returns a function replacing every legend phrase in a line with its code."""
+    if not legend:
+        return lambda line: line
+    pattern = re.compile('|'.join(re.escape(p) for p in sorted(legend, key=len, reverse=True)))
+    return lambda line: pattern.sub(lambda m: legend[m.group(0)], line)
+
+def estimate_tokens(text_length: int) -> int:
+    """Estimates the number of model tokens for a text of the given length."""
+    return text_length // CHARS_PER_TOKEN + 1
+
+def section_sizes(cards: List[sqlite3.Row], lines: List[str], legend: List[str], suffix: str) -> Dict[str, int]:
+    """
+    Measures the character count of each part of system.txt.
+    
+    Args:
+        cards: The cards, in the same order as lines.
+        lines: The card strings as written.
+        legend: The legend lines, if any.
+        suffix: The instructions written after the card list.
+        
+    Returns:
+        A dictionary mapping a section name to its size in characters.
+    """
+    sizes = {'legend': sum(len(l) + 1 for l in legend)}
+    for card, line in zip(cards, lines):
+        count_line(sizes, card, line)
+    return finish_sizes(sizes, suffix)
+
+def count_line(sizes: Dict[str, int], card: sqlite3.Row, line: str):
+    """Adds one card string to the per-type section sizes."""
+    key = f"cards:{card['card_type'] or 'other'}"
+    sizes[key] = sizes.get(key, 0) + len(line) + 1
+
+def finish_sizes(sizes: Dict[str, int], suffix: str) -> Dict[str, int]:
+    """Adds the suffix and the total to section sizes."""
+    sizes['suffix'] = len(suffix)
+    sizes['total'] = sum(sizes.values())
+    return sizes
+
+def print_size_report(before: Dict[str, int], after: Dict[str, int]):
+    """Prints characters and estimated tokens per section, before and after encoding."""
+    print(f"{'section':<16}{'chars':>10}{'tokens':>9}{'chars':>10}{'tokens':>9}{'saved':>8}")
+    for section in before:
+        b, a = before[section], after.get(section, 0)
+        saved = f"{1 - a / b:.0%}" if b else '-'
+        print(f"{section:<16}{b:>10}{estimate_tokens(b):>9}{a:>10}{estimate_tokens(a):>9}{saved:>8}")
+
+def write_cards_to_file(cards: List[sqlite3.Row], out_path: str = "system.txt",
+                        compact: bool = False, report: bool = False):
+    """
+    Writes the final formatted list of cards to a text file.
+    
+    Args:
+        cards: The list of cards to write.
+        out_path: The path to the output file.
+        compact: Whether to write the compact encoding with a phrase legend.
+        report: Whether to print the size of each section before and after encoding.
+    """
+    name_set_counts = count_name_sets(cards)
 
     random.shuffle(cards)
 
+    lines = [format_card_string(card, name_set_counts).replace('\n', '') for card in cards]
+    legend, suffix = [], SUFFIX
+    if compact:
+        legend, encoded = encode_compact(cards, lines)
+        suffix = COMPACT_NOTES + SUFFIX
+    else:
+        encoded = lines
+
+    if report:
+        print_size_report(section_sizes(cards, lines, [], SUFFIX),
+                          section_sizes(cards, encoded, legend, suffix))
+
     with open(out_path, 'w', encoding='utf-8') as f:
+        if legend:
+            f.write('Legend:\n')
+            f.write('\n'.join(legend) + '\n')
         f.write('Card List:\n')
-        for card in cards:
-            formatted_card = format_card_string(card, name_set_counts)
-            f.write(formatted_card.replace('\n', '') + '\n')
-        f.write(SUFFIX)
+        for line in encoded:
+            f.write(line + '\n')
+        f.write(suffix)
 
-def main():
+def write_prompt_index(cards: List[sqlite3.Row], db_path: str = "pokemon_cards.db"):
+    """
+    Stores the formatted card lines with a full-text index so app.py can
+    assemble a card list for each request instead of sending all of system.txt.
+    
+    Args:
+        cards: The list of cards written to system.txt.
+        db_path: The path to the SQLite database file.
+    """
+    name_set_counts = count_name_sets(cards)
+    with sqlite3.connect(db_path) as conn:
+        create_prompt_index(conn)
+        insert_prompt_cards(conn, [
+            (rowid, card, format_card_string(card, name_set_counts).replace('\n', ''))
+            for rowid, card in enumerate(cards, 1)
+        ])
+        index_prompt_cards(conn)
+
+def create_prompt_index(conn: sqlite3.Connection):
+    """Recreates the empty prompt_cards and prompt_cards_fts tables."""
+    conn.execute("DROP TABLE IF EXISTS prompt_cards")
+    conn.execute("DROP TABLE IF EXISTS prompt_cards_fts")
+    conn.execute("""
+        CREATE TABLE prompt_cards (
+            id INTEGER PRIMARY KEY,
+            line TEXT,
+            name TEXT,
+            card_type TEXT,
+            evolve_from TEXT,
+            is_basic_energy INTEGER
+        )
+    """)
+    conn.execute("""
+        CREATE VIRTUAL TABLE prompt_cards_fts USING fts5(
+            name, effect, abilities, attacks, types
+        )
+    """)
+
+def insert_prompt_cards(conn: sqlite3.Connection, batch: List[Tuple[int, sqlite3.Row, str]]):
+    """
+    Adds formatted cards to the prompt index.
+    
+    Args:
+        conn: An open connection to the card database.
+        batch: (rowid, card, formatted line) for each card.
+    """
+    conn.executemany(
+        "INSERT INTO prompt_cards VALUES (?, ?, ?, ?, ?, ?)",
+        [(rowid, line, card['name'], card['card_type'], card['evolve_from'] or '', card['is_basic_energy'])
+         for rowid, card, line in batch],
+    )
+    conn.executemany(
+        "INSERT INTO prompt_cards_fts (rowid, name, effect, abilities, attacks, types) VALUES (?, ?, ?, ?, ?, ?)",
+        [(rowid, card['name'], card['effect'] or '', card['abilities'] or '',
+          card['attacks'] or '', card['types'] or '')
+         for rowid, card, _ in batch],
+    )
+
+def index_prompt_cards(conn: sqlite3.Connection):
+    """Adds the lookup indexes once prompt_cards is filled."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_prompt_cards_name ON prompt_cards (name)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_prompt_cards_evolve_from ON prompt_cards (evolve_from)")
+
+def write_pipeline(db_path: str = "pokemon_cards.db", out_path: str = "system.txt",
+                   compact: bool = False, report: bool = False,
+                   fmt: str = DEFAULT_FORMAT, index: bool = True):
+    """
+    Writes system.txt and the prompt index from a single SQL query, streaming
+    rows into a buffered writer so memory stays flat as sets are added.
+    
+    Args:
+        db_path: The path to the SQLite database file.
+        out_path: The path to the output file.
+        compact: Whether to write the compact encoding with a phrase legend.
+        report: Whether to print the size of each section before and after encoding.
+        fmt: The format whose card pool to write, a key of FORMATS.
+        index: Whether to rebuild the prompt index from these cards.
+    """
+    with sqlite3.connect(db_path) as conn:
+        prepare_pipeline(conn)
+
+        legend, suffix = {}, SUFFIX
+        if compact:
+            # The legend needs phrase counts over every card, so take one extra pass.
+            legend = build_legend(
+                compact_card_string(card, format_card_string(card).replace('\n', ''))
+                for card in stream_cards(conn, fmt)
+            )
+            suffix = COMPACT_NOTES + SUFFIX
+        encode = legend_encoder(legend)
+        legend_lines = [f"{code}={phrase}" for phrase, code in legend.items()]
+
+        if index:
+            create_prompt_index(conn)
+        before, after = {'legend': 0}, {'legend': sum(len(l) + 1 for l in legend_lines)}
+        batch = []
+        with open(out_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_BYTES) as f:
+            if legend_lines:
+                f.write('Legend:\n')
+                f.write('\n'.join(legend_lines) + '\n')
+            f.write('Card List:\n')
+            for rowid, card in enumerate(stream_cards(conn, fmt), 1):
+                line = format_card_string(card).replace('\n', '')
+                encoded = encode(compact_card_string(card, line)) if compact else line
+                f.write(encoded + '\n')
+                if report:
+                    count_line(before, card, line)
+                    count_line(after, card, encoded)
+                if index:
+                    batch.append((rowid, card, line))
+                if len(batch) >= PROMPT_INDEX_BATCH:
+                    insert_prompt_cards(conn, batch)
+                    batch = []
+            f.write(suffix)
+        if index:
+            insert_prompt_cards(conn, batch)
+            index_prompt_cards(conn)
+
+    if report:
+        print_size_report(finish_sizes(before, SUFFIX), finish_sizes(after, suffix))
+
+def main(argv=None):
     """Main function to fetch, process, and write card data."""
-    all_cards = fetch_cards_from_db()
-    filtered_cards = group_and_filter_cards(all_cards)
-    # Sort for consistent output before shuffling for randomness in the list
-    filtered_cards.sort(key=lambda c: (c['card_type'] != 'pokemon', c['set_name'], c['number']))
-    write_cards_to_file(filtered_cards)
+    parser = argparse.ArgumentParser(description="Write the card list prompt for each format.")
+    parser.add_argument("--compact", action="store_true",
+                        help="dictionary-code repeated phrases and abbreviate energies")
+    parser.add_argument("--report", action="store_true",
+                        help="print characters and estimated tokens per section")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="group and pick cards in SQL and stream them to the file")
+    parser.add_argument("--formats", nargs="+", choices=list(FORMATS), default=list(FORMATS),
+                        help="formats to write a prompt for (default: all)")
+    parser.add_argument("--store", action="store_true",
+                        help="read cards from the mmapped pokemon_cards.bin instead of SQLite")
+    args = parser.parse_args(argv)
+    report = args.report or args.compact
+
+    for fmt in args.formats:
+        out_path = FORMAT_PROMPTS[fmt]
+        # The retrieval index is built from the default format's card pool.
+        index = fmt == DEFAULT_FORMAT
+        if report:
+            print(f"{fmt} ({out_path}):")
+        if args.pipeline:
+            write_pipeline(out_path=out_path, compact=args.compact, report=report, fmt=fmt, index=index)
+            continue
+
+        if args.store:
+            all_cards = fetch_cards_from_store(fmt=fmt)
+        else:
+            all_cards = fetch_cards_from_db(fmt=fmt)
+        filtered_cards = group_and_filter_cards(all_cards)
+        # Sort for consistent output before shuffling for randomness in the list
+        filtered_cards.sort(key=lambda c: (c['card_type'] != 'pokemon', c['set_name'], c['number']))
+        if index:
+            write_prompt_index(filtered_cards)
+        write_cards_to_file(filtered_cards, out_path=out_path, compact=args.compact, report=report)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,81 @@
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupProfile:
+    """Records how long each import and initialisation phase took, and when the app became ready."""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.started = clock()
+        self.phases: dict[str, float] = {}
+        self.ready_after_s: float | None = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        started = self.clock()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[name] = self.clock() - started
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_after_s is not None
+
+    def mark_ready(self) -> None:
+        if self.ready_after_s is None:
+            self.ready_after_s = self.clock() - self.started
+            sys.stderr.write(f"[INFO] Ready after {self.ready_after_s:.2f}s: {self.summary()}\n")
+
+    def summary(self) -> str:
+        with self._lock:
+            return ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.phases.items())
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "ready_after_s": self.ready_after_s,
+                "phases_s": dict(self.phases),
+            }
+
+
+_UNSET = object()
+
+
+class Lazy:
+    """Builds a value on first call, once, even when several threads ask at the same time."""
+
+    def __init__(self, name: str, factory, profile: StartupProfile | None = None):
+        self.name = name
+        self._factory = factory
+        self._profile = profile
+        self._value = _UNSET
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._value is not _UNSET
+
+    def __call__(self):
+        value = self._value
+        if value is not _UNSET:
+            return value
+        with self._lock:
+            if self._value is _UNSET:
+                if self._profile is not None:
+                    with self._profile.phase(f"init {self.name}"):
+                        self._value = self._factory()
+                else:
+                    self._value = self._factory()
+            return self._value
+
+
+def lazy(name: str, profile: StartupProfile | None = None):
+    """Decorator form of Lazy for a zero-argument factory function."""
+    return lambda factory: Lazy(name, factory, profile)
@@ -0,0 +1,80 @@
+import json
+
+
+class RecipeStreamParser:
+    """Pulls complete Deck entries out of a Recipe JSON document as it streams in.
+
+    Only the characters added since the last ``feed`` are scanned, so the
+    whole response is parsed once no matter how many chunks it arrives in.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._entry_start = -1
+
+    def feed(self, chunk: str) -> list[dict]:
+        self.text += chunk
+        entries = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                # Depth 1 is the Recipe object, 2 the Deck array, 3 an entry.
+                self._depth += 1
+                if ch == "{" and self._depth == 3:
+                    self._entry_start = i
+            elif ch in "}]":
+                if ch == "}" and self._depth == 3 and self._entry_start >= 0:
+                    try:
+                        entries.append(json.loads(text[self._entry_start:i + 1]))
+                    except json.JSONDecodeError:
+                        pass
+                    self._entry_start = -1
+                self._depth -= 1
+        self._pos = len(text)
+        return entries
+
+    def partial_comment(self) -> str:
+        key = self.text.find('"Comment"')
+        if key < 0:
+            return ""
+        colon = self.text.find(":", key + len('"Comment"'))
+        start = self.text.find('"', colon + 1) if colon >= 0 else -1
+        if start < 0:
+            return ""
+        body = self.text[start + 1:]
+        end = _string_end(body)
+        if end >= 0:
+            body = body[:end]
+        # Trim a dangling escape sequence until what is left decodes.
+        for cut in range(min(len(body), 6) + 1):
+            try:
+                return json.loads(f'"{body[:len(body) - cut]}"')
+            except json.JSONDecodeError:
+                continue
+        return ""
+
+
+def _string_end(body: str) -> int:
+    escape = False
+    for i, ch in enumerate(body):
+        if escape:
+            escape = False
+        elif ch == "\\":
+            escape = True
+        elif ch == '"':
+            return i
+    return -1
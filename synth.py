@@ -0,0 +1,287 @@
+import argparse
+import json
+import os
+import random
+import sqlite3
+
+from ext import display_set_code
+from short import DEFAULT_FORMAT, FORMATS, pool_where
+
+# (set id prefix, series, ptcgoCode prefix, regulation marks, sets at 1x,
+# first release year) per era, in the proportions of the real dataset.
+ERAS = [
+    ("sv", "Scarlet & Violet", "SV", "ghi", 10, 2023),
+    ("swsh", "Sword & Shield", "SSH", "def", 12, 2020),
+    ("sm", "Sun & Moon", "SUM", "", 12, 2017),
+    ("xy", "XY", "XY", "", 12, 2014),
+    ("bw", "Black & White", "BLW", "", 11, 2011),
+    ("dp", "Diamond & Pearl", "DP", "", 7, 2007),
+    ("ex", "EX", "RS", "", 16, 2003),
+    ("base", "Base", "BS", "", 6, 1999),
+]
+# Promo sets per era, with the codes ext.PROMO_SET_CODES rewrites.
+PROMOS = {"sv": "PR-SV", "swsh": "PR-SW", "sm": "PR-SM"}
+# Share of sets the real data ships without a ptcgoCode; ext.py skips them.
+UNCODED_SHARE = 0.05
+CARDS_PER_SET = (80, 200)
+# Distinct Pokémon, Trainer and special Energy names at 1x.
+SPECIES = 1000
+TRAINERS = 450
+SPECIAL_ENERGY = 40
+
+TYPES = ["Grass", "Fire", "Water", "Lightning", "Psychic", "Fighting", "Darkness", "Metal", "Dragon", "Colorless"]
+BASIC_TYPES = TYPES[:8]
+TRAINER_KINDS = ["Item", "Item", "Supporter", "Stadium", "Pokémon Tool"]
+RARITIES = ["Common", "Common", "Common", "Uncommon", "Uncommon", "Rare", "Rare Holo",
+            "Double Rare", "Ultra Rare", "Illustration Rare", "Special Illustration Rare", "Hyper Rare"]
+# Rule-box suffixes and the rarity printed on them, per era.
+RULE_BOX = {
+    "sv": [("ex", "Double Rare")],
+    "swsh": [("V", "Rare Holo V"), ("VMAX", "Rare Holo VMAX"), ("VSTAR", "Rare Holo VSTAR")],
+    "sm": [("GX", "Rare Holo GX")],
+    "xy": [("EX", "Rare Holo EX")],
+    "bw": [("EX", "Rare Holo EX")],
+}
+ACE_SPEC = {"sv": "ACE SPEC Rare", "xy": "Rare ACE", "bw": "Rare ACE"}
+# Two-letter syllables keep generated names unique at any length.
+SYLLABLES = ["ka", "zu", "ra", "mi", "to", "ch", "no", "gr", "ve", "bi",
+             "sa", "do", "lu", "fe", "qu", "mo", "ta", "xe", "py", "ro"]
+WORDS = ["draw", "search", "switch", "discard", "attach", "heal", "shuffle", "bench", "damage", "energy"]
+ATTACK_TEXTS = [
+    "",
+    "Flip a coin. If heads, your opponent's Active Pokémon is now Paralyzed.",
+    "Discard an Energy from this Pokémon.",
+    "This attack does 20 damage to 1 of your opponent's Benched Pokémon.",
+    "Search your deck for up to 2 Basic Energy cards and attach them to your Pokémon. Then, shuffle your deck.",
+    "During your opponent's next turn, this Pokémon takes 30 less damage from attacks.",
+]
+
+
+def synthetic_name(i: int, words: int = 2) -> str:
+    parts = []
+    while True:
+        parts.append(SYLLABLES[i % len(SYLLABLES)])
+        i //= len(SYLLABLES)
+        if not i and len(parts) >= words:
+            break
+    return "".join(parts).capitalize()
+
+
+def text(rng: random.Random, sentences: int) -> str:
+    return " ".join(
+        f"{' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 9))).capitalize()}."
+        for _ in range(sentences)
+    )
+
+
+def species_attacks(species: int) -> list[dict]:
+    # Reprints of a species mostly share attacks, as they do in the real data.
+    rng = random.Random(species)
+    return [
+        {
+            "name": f"{synthetic_name(rng.randrange(400))} {rng.choice(['Blast', 'Strike', 'Claw', 'Beam'])}",
+            "cost": rng.sample(TYPES, 1) + ["Colorless"] * rng.randint(0, 3),
+            "convertedEnergyCost": 2,
+            "damage": str(rng.choice([10, 20, 30, 60, 90, 120, 180, 230])),
+            "text": rng.choice(ATTACK_TEXTS),
+        }
+        for _ in range(rng.randint(1, 2))
+    ]
+
+
+def pokemon_card(rng: random.Random, era: str, species: int) -> dict:
+    name = synthetic_name(species)
+    stage = species % 3
+    card = {
+        "name": name,
+        "supertype": "Pokémon",
+        "subtypes": [["Basic", "Stage 1", "Stage 2"][stage]],
+        "hp": str(rng.choice([40, 60, 70, 90, 120, 150, 190, 230, 280, 330])),
+        "types": [TYPES[species % len(TYPES)]],
+        "attacks": species_attacks(species),
+        "weaknesses": [{"type": rng.choice(TYPES[:8]), "value": "×2"}],
+        "retreatCost": ["Colorless"] * rng.randint(0, 4),
+        "convertedRetreatCost": 0,
+        "rarity": rng.choice(RARITIES),
+        "flavorText": text(rng, 1),
+        "nationalPokedexNumbers": [species % 1025 + 1],
+    }
+    if stage:
+        card["evolvesFrom"] = synthetic_name(species - 1)
+    if rng.random() < 0.2:
+        card["abilities"] = [{"name": synthetic_name(rng.randrange(400)) + " Aura", "text": text(rng, 2), "type": "Ability"}]
+    if era in RULE_BOX and rng.random() < 0.12:
+        suffix, rarity = rng.choice(RULE_BOX[era])
+        card["name"] = f"{name} {suffix}"
+        card["subtypes"].append(suffix)
+        card["rarity"] = rarity
+        card["rules"] = [f"Pokémon {suffix} rule: When your Pokémon {suffix} is Knocked Out, your opponent takes 2 Prize cards."]
+        if suffix == "VSTAR":
+            card["abilities"] = [{"name": "Star Burst", "text": text(rng, 2), "type": "VSTAR Power"}]
+    elif era == "swsh" and rng.random() < 0.01:
+        card["name"] = f"Radiant {name}"
+        card["subtypes"].append("Radiant")
+        card["rarity"] = "Radiant Rare"
+        card["rules"] = ["Radiant Pokémon Rule: You can't have more than 1 Radiant Pokémon in your deck."]
+    return card
+
+
+def trainer_card(rng: random.Random, era: str, trainer: int) -> dict:
+    kind = TRAINER_KINDS[trainer % len(TRAINER_KINDS)]
+    name = f"{synthetic_name(trainer, 3)} {kind.split()[-1] if kind != 'Item' else 'Ball'}"
+    if kind == "Supporter" and trainer % 7 == 0:
+        name += f" ({synthetic_name(trainer // 7)})"
+    card = {
+        "name": name,
+        "supertype": "Trainer",
+        "subtypes": [kind],
+        "rules": [text(random.Random(trainer), 2), f"You may play any number of {kind} cards during your turn."],
+        "rarity": rng.choice(RARITIES[:6]),
+    }
+    if era in ACE_SPEC and trainer % 40 == 0:
+        card["subtypes"].append("ACE SPEC")
+        card["rarity"] = ACE_SPEC[era]
+    return card
+
+
+def energy_card(rng: random.Random, special: int | None) -> dict:
+    if special is None:
+        energy_type = rng.choice(BASIC_TYPES)
+        return {"name": f"{energy_type} Energy", "supertype": "Energy", "subtypes": ["Basic"], "rarity": "Common"}
+    return {
+        "name": f"{synthetic_name(special, 3)} Energy",
+        "supertype": "Energy",
+        "subtypes": ["Special"],
+        "rules": [text(random.Random(special), 2)],
+        "rarity": "Uncommon",
+    }
+
+
+def make_sets(scale: int, rng: random.Random) -> list[tuple[str, dict]]:
+    sets = []
+    for prefix, series, code, regulations, count, year in ERAS:
+        for i in range(1, count * scale + 1):
+            info = {
+                "id": f"{prefix}{i}",
+                "name": f"{series} {synthetic_name(i)}",
+                "series": series,
+                "printedTotal": 0,
+                "total": 0,
+                "legalities": {"unlimited": "Legal"},
+                "releaseDate": f"{year + (i - 1) * 4 // (count * scale)}/0{i % 9 + 1}/01",
+                "images": {"symbol": f"https://images.example/{prefix}{i}/symbol.png"},
+            }
+            if rng.random() >= UNCODED_SHARE:
+                info["ptcgoCode"] = f"{code}{i}"
+            sets.append((prefix, info))
+        if prefix in PROMOS:
+            sets.append((prefix, {"id": f"{prefix}p", "name": f"{series} Black Star Promos", "series": series,
+                                  "ptcgoCode": PROMOS[prefix], "releaseDate": f"{year}/01/01"}))
+    return sets
+
+
+def make_cards(era: str, info: dict, regulations: str, scale: int, rng: random.Random) -> list[dict]:
+    cards = []
+    for number in range(1, rng.randint(*CARDS_PER_SET) + 1):
+        roll = rng.random()
+        if roll < 0.62:
+            card = pokemon_card(rng, era, rng.randrange(SPECIES * scale))
+        elif roll < 0.9:
+            card = trainer_card(rng, era, rng.randrange(TRAINERS * scale))
+        elif roll < 0.95:
+            card = energy_card(rng, None)
+        else:
+            card = energy_card(rng, rng.randrange(SPECIAL_ENERGY * scale))
+        card["id"] = f"{info['id']}-{number}"
+        card["number"] = str(number)
+        card["artist"] = synthetic_name(rng.randrange(200))
+        card["legalities"] = {"unlimited": "Legal"}
+        if regulations and not (card["supertype"] == "Energy" and card["subtypes"] == ["Basic"]):
+            card["regulationMark"] = rng.choice(regulations).upper()
+        card["images"] = {"small": f"https://images.example/{info['id']}/{number}.png"}
+        cards.append(card)
+    return cards
+
+
+def generate(root: str = "pokemon-tcg-data", scale: int = 1, seed: int = 0) -> dict:
+    """
+    Writes a synthetic sets/en.json and cards/en/*.json under root, shaped like
+    the pokemon-tcg-data checkout ext.py reads. The same scale and seed always
+    produce the same files.
+
+    Args:
+        root: The dataset folder to write.
+        scale: How many times the size of the real dataset to generate.
+        seed: Seed for the random choices.
+
+    Returns:
+        The number of sets and cards written.
+    """
+    rng = random.Random(seed)
+    regulations = {prefix: marks for prefix, _, _, marks, _, _ in ERAS}
+    os.makedirs(os.path.join(root, "sets"), exist_ok=True)
+    os.makedirs(os.path.join(root, "cards", "en"), exist_ok=True)
+
+    sets = make_sets(scale, rng)
+    total = 0
+    for era, info in sets:
+        cards = make_cards(era, info, regulations[era], scale, rng)
+        info["printedTotal"] = info["total"] = len(cards)
+        with open(os.path.join(root, "cards", "en", f"{info['id']}.json"), "w", encoding="utf-8") as f:
+            json.dump(cards, f, ensure_ascii=False, indent=2)
+        total += len(cards)
+    with open(os.path.join(root, "sets", "en.json"), "w", encoding="utf-8") as f:
+        json.dump([info for _, info in sets], f, ensure_ascii=False, indent=2)
+    return {"sets": len(sets), "cards": total}
+
+
+def canned_recipes(db_path: str = "pokemon_cards.db", count: int = 200, seed: int = 0) -> list[dict]:
+    """
+    Builds deck recipes like the model returns, {name: (count, category)},
+    from the default format's cards in a built database. Some names are
+    misspelt, carry the wrong set code or don't exist, so the fuzzy and
+    unresolved paths are exercised too.
+    """
+    rng = random.Random(seed)
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute(
+            f"SELECT name, set_name, card_type FROM cards WHERE {pool_where(FORMATS[DEFAULT_FORMAT])}"
+        ).fetchall()
+    pokemon = [(name, set_name) for name, set_name, card_type in rows if card_type == "pokemon"]
+    trainers = sorted({name for name, _, card_type in rows if card_type == "trainer"})
+    energy = sorted({name for name, _, card_type in rows if card_type == "energy"})
+
+    recipes = []
+    for _ in range(count):
+        recipe = {}
+        for name, set_name in rng.sample(pokemon, min(len(pokemon), rng.randint(5, 9))):
+            code = display_set_code(set_name)
+            roll = rng.random()
+            if roll < 0.1 and len(name) > 4:
+                drop = rng.randrange(1, len(name) - 1)
+                name = name[:drop] + name[drop + 1:]
+            elif roll < 0.15:
+                code = display_set_code(rng.choice(pokemon)[1])
+            recipe[f"{name.title()} {code}"] = (rng.randint(1, 4), "Pokemon")
+        for name in rng.sample(trainers, min(len(trainers), rng.randint(10, 16))):
+            if rng.random() < 0.05:
+                name = f"{synthetic_name(rng.randrange(10 ** 6), 4)} Card"
+            recipe[name.title()] = (rng.randint(1, 4), "Trainer")
+        for name in rng.sample(energy, min(len(energy), rng.randint(1, 2))):
+            recipe[name.title()] = (rng.randint(4, 12), "Energy")
+        recipes.append(recipe)
+    return recipes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic pokemon-tcg-data checkout for benchmarks.")
+    parser.add_argument("--out", default="pokemon-tcg-data", help="dataset folder to write")
+    parser.add_argument("--scale", type=int, default=1, help="multiple of the real dataset's size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    written = generate(args.out, args.scale, args.seed)
+    print(f"Wrote {written['cards']} cards in {written['sets']} sets to {args.out}.")
+
+
+if __name__ == "__main__":
+    main()